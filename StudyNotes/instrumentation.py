@@ -0,0 +1,330 @@
+"""
+Per-request performance metrics: query count, SQL time, slowest statements, template render time and response size.
+
+RequestMetricsMiddleware writes one JSON log line per request to the "studynotes.requests" logger and feeds
+in-process histograms that metrics_view exposes in the Prometheus text format. The histograms live in the worker
+process, Prometheus scrapes every worker separately.
+"""
+import asyncio
+import heapq
+import hmac
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates, Template as BaseTemplate, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+from .postgresql.pool import pools
+
+logger = logging.getLogger("studynotes.requests")
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+
+class RequestMetrics:
+    """Numbers of one request, collected by record_query and Template while it is the current one"""
+
+    def __init__(self, slow_queries=0):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.connect_time = 0.0
+        self.wall_time = 0.0
+        self.render_depth = 0
+        self.slow_queries = slow_queries
+        self.slowest = []
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.slow_queries:
+            # min-heap of the slowest statements, parameters are left out so no user data reaches the logs
+            entry = (duration, str(sql)[:500])
+            if len(self.slowest) < self.slow_queries:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def slowest_queries(self):
+        return [{"ms": round(duration * 1000, 2), "sql": sql} for duration, sql in sorted(self.slowest, reverse=True)]
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(connection, **kwargs):
+    # connections are per thread, the async ORM queries from another thread than the one running the middleware,
+    # so every connection gets the wrapper and the context variable tells which request a query belongs to
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+@contextmanager
+def collect(slow_queries=0):
+    for connection in connections.all():
+        install_query_recorder(connection)
+    metrics = RequestMetrics(slow_queries)
+    token = current_metrics.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_time = time.perf_counter() - start
+        current_metrics.reset(token)
+
+
+class Template(BaseTemplate):
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        # templates rendered while another one renders are part of its time
+        metrics.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_depth -= 1
+            if not metrics.render_depth:
+                metrics.render_time += time.perf_counter() - start
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """The stock Django template backend, with render times reported to the current RequestMetrics"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def format_labels(labels):
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped))
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.copy().items()):
+            lines.append(f"{self.name}{{{format_labels(dict(zip(self.labelnames, labels)))}}} {value}")
+        return lines
+
+
+class Gauge:
+    """Values read from collect() when exposed, {label values: value}"""
+
+    def __init__(self, name, documentation, labelnames, collect, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+        self.kind = kind
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{{{format_labels(dict(zip(self.labelnames, labels)))}}} {value}")
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram, buckets are counted separately and only made cumulative when exposed"""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # one count per bucket plus +Inf, then sum and count
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0, 0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self.series.items())
+        for labels, series in snapshot:
+            labels = dict(zip(self.labelnames, labels))
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                lines.append(f"{self.name}_bucket{{{format_labels({**labels, 'le': bound})}}} {total}")
+            lines.append(f"{self.name}_sum{{{format_labels(labels)}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{format_labels(labels)}}} {series[-1]}")
+        return lines
+
+
+LABELS = ("view", "method")
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = Counter("studynotes_requests_total", "Requests by view, method and status code.", LABELS + ("status",))
+REQUEST_DURATION = Histogram("studynotes_request_duration_seconds", "Time spent in the view and the middleware "
+                             "below the metrics middleware.", LABELS, SECONDS)
+REQUEST_QUERIES = Histogram("studynotes_request_queries", "SQL queries per request.", LABELS,
+                            (0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+REQUEST_DB_TIME = Histogram("studynotes_request_db_seconds", "SQL time per request.", LABELS, SECONDS)
+REQUEST_RENDER_TIME = Histogram("studynotes_request_render_seconds", "Template render time per request.", LABELS,
+                                SECONDS)
+RESPONSE_SIZE = Histogram("studynotes_response_size_bytes", "Size of non-streaming response bodies.", LABELS,
+                          (1000, 5000, 10000, 25000, 50000, 100000, 250000, 1000000))
+DB_CONNECT = Histogram("studynotes_db_connection_acquire_seconds", "Time to open a database connection or take "
+                       "one from the pool.", ("alias", "pooled"),
+                       (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+
+
+def collect_pool_stats():
+    """Stats of the pools of each alias, summed over its connection parameters"""
+    totals = {}
+    for (alias, _), pool in list(pools.items()):
+        stats = pool.stats()
+        totals[alias] = {name: totals.get(alias, {}).get(name, 0) + value for name, value in stats.items()}
+    return totals
+
+
+DB_POOL_CONNECTIONS = Gauge("studynotes_db_pool_connections", "Pooled connections by state.", ("alias", "state"),
+                            lambda: {(alias, state): stats[state] for alias, stats in collect_pool_stats().items()
+                                     for state in ("in_use", "idle", "waiting")})
+DB_POOL_MAX_SIZE = Gauge("studynotes_db_pool_max_size", "Connections the pool may open.", ("alias",),
+                         lambda: {(alias,): stats["max_size"] for alias, stats in collect_pool_stats().items()})
+DB_POOL_TIMEOUTS = Gauge("studynotes_db_pool_timeouts_total", "Requests that gave up waiting for a connection.",
+                         ("alias",), lambda: {(alias,): stats["timeouts"]
+                                              for alias, stats in collect_pool_stats().items()}, kind="counter")
+METRICS = [REQUESTS, REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_TIME, REQUEST_RENDER_TIME, RESPONSE_SIZE,
+           DB_CONNECT, DB_POOL_CONNECTIONS, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUTS]
+
+
+def observe_connect(alias, pooled, duration):
+    DB_CONNECT.observe((alias, str(pooled).lower()), duration)
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.connect_time += duration
+
+
+def get_view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unresolved>"
+
+
+def record_request(request, response, metrics):
+    view = get_view_name(request)
+    labels = (view, request.method)
+    size = None if response.streaming else len(response.content)
+    REQUESTS.inc(labels + (str(response.status_code),))
+    REQUEST_DURATION.observe(labels, metrics.wall_time)
+    REQUEST_QUERIES.observe(labels, metrics.queries)
+    REQUEST_DB_TIME.observe(labels, metrics.db_time)
+    REQUEST_RENDER_TIME.observe(labels, metrics.render_time)
+    if size is not None:
+        RESPONSE_SIZE.observe(labels, size)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(metrics.wall_time * 1000, 2),
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_time * 1000, 2),
+            "db_connect_ms": round(metrics.connect_time * 1000, 2),
+            "render_ms": round(metrics.render_time * 1000, 2),
+            "response_bytes": size,
+            "slowest_queries": metrics.slowest_queries(),
+        }))
+
+
+class RequestMetricsMiddleware:
+    """Enabled with REQUEST_METRICS_ENABLED, put it first in MIDDLEWARE so session and auth queries are counted"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # same switch as django.utils.deprecation.MiddlewareMixin, so an async chain stays async under ASGI
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        with collect(settings.REQUEST_METRICS_SLOW_QUERIES) as metrics:
+            response = self.get_response(request)
+        record_request(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        with collect(settings.REQUEST_METRICS_SLOW_QUERIES) as metrics:
+            response = await self.get_response(request)
+        record_request(request, response, metrics)
+        return response
+
+
+def render_metrics():
+    return "\n".join(line for metric in METRICS for line in metric.expose()) + "\n"
+
+
+def has_metrics_token(request):
+    scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    return bool(settings.REQUEST_METRICS_TOKEN) and scheme.lower() == "bearer" \
+        and hmac.compare_digest(token.strip().encode(), settings.REQUEST_METRICS_TOKEN.encode())
+
+
+def metrics_view(request):
+    """Routed with REQUEST_METRICS_ENABLED, for an allowed IP with a staff session or the shared token"""
+    if request.META.get("REMOTE_ADDR") not in settings.REQUEST_METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    user = getattr(request, "user", None)
+    if not (user is not None and user.is_active and user.is_staff) and not has_metrics_token(request):
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
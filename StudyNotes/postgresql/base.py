@@ -0,0 +1,94 @@
+"""
+The stock PostgreSQL backend, timing how long getting a connection takes and, with a POOL entry in the database
+settings, taking connections from a per-process pool instead of opening one per request:
+
+    "POOL": {"MAX_SIZE": 10, "TIMEOUT": 5}
+
+With a pool, closing a connection at the end of a request hands it back, so CONN_MAX_AGE should stay 0.
+CONN_HEALTH_CHECKS also checks pooled connections before they are handed out again.
+"""
+import hashlib
+import json
+import time
+
+import psycopg2.extras
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+from StudyNotes.instrumentation import observe_connect
+
+from .pool import ConnectionPool, PoolTimeout, pools, pools_lock
+
+Database = base.Database
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if not connection.autocommit:
+            # the SELECT began a transaction, Django can't switch autocommit back on inside it
+            connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+def pool_key(alias, conn_params):
+    """Pools are per alias and connection parameters, changed settings, e.g. the test database's, get their own"""
+    params = json.dumps(conn_params, sort_keys=True, default=str)
+    return alias, hashlib.sha256(params.encode()).hexdigest()[:16]
+
+
+def get_pool(alias, settings_dict, conn_params):
+    key = pool_key(alias, conn_params)
+    with pools_lock:
+        if key not in pools:
+            options = settings_dict["POOL"]
+            pools[key] = ConnectionPool(lambda: Database.connect(**conn_params), options.get("MAX_SIZE", 10),
+                                        options.get("TIMEOUT", 5),
+                                        check=is_usable if settings_dict["CONN_HEALTH_CHECKS"] else None)
+        return pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pool = None
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        if not self.settings_dict.get("POOL"):
+            connection = super().get_new_connection(conn_params)
+            observe_connect(self.alias, False, time.perf_counter() - start)
+            return connection
+        try:
+            pool = get_pool(self.alias, self.settings_dict, conn_params)
+            connection = pool.getconn()
+        except PoolTimeout as exc:
+            raise Database.OperationalError(str(exc)) from exc
+        # what the stock get_new_connection does after connecting
+        options = self.settings_dict["OPTIONS"]
+        self.isolation_level = options.get("isolation_level", connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        # the connection goes back to the pool it came from, whatever the settings are by then
+        self.pool = pool
+        observe_connect(self.alias, True, time.perf_counter() - start)
+        return connection
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+        connection = self.connection
+        discard = bool(connection.closed)
+        if not discard and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            # left in a transaction, e.g. closed inside atomic()
+            try:
+                connection.rollback()
+            except Database.Error:
+                discard = True
+        pool, self.pool = self.pool, None
+        with self.wrap_database_errors:
+            pool.putconn(connection, discard)
@@ -0,0 +1,80 @@
+import threading
+
+# one pool per database alias, connection parameters and worker process, keyed by postgresql.base.pool_key
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    At most max_size DB-API connections of one database per worker process.
+    Idle connections are reused newest first, the ones failing check() are closed and replaced.
+    """
+
+    def __init__(self, connect, max_size, timeout, check=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.idle = []
+        self.in_use = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+
+    def getconn(self):
+        with self.lock:
+            self.waiting += 1
+        try:
+            acquired = self.slots.acquire(timeout=self.timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        if not acquired:
+            with self.lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"All {self.max_size} connections of the pool stayed in use for {self.timeout}s")
+        try:
+            connection = self.get_idle() or self.connect()
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.in_use += 1
+        return connection
+
+    def get_idle(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection = self.idle.pop()
+            if self.check is None or self.check(connection):
+                return connection
+            close_quietly(connection)
+
+    def putconn(self, connection, discard=False):
+        with self.lock:
+            self.in_use -= 1
+            if not discard:
+                self.idle.append(connection)
+        self.slots.release()
+        if discard:
+            close_quietly(connection)
+
+    def stats(self):
+        with self.lock:
+            return {"in_use": self.in_use, "idle": len(self.idle), "waiting": self.waiting,
+                    "max_size": self.max_size, "timeouts": self.timeouts}
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
@@ -0,0 +1,145 @@
+"""
+Opt-in profiling of sampled and slow requests.
+
+In "stack" mode a single background thread takes the Python stack of every watched request thread each
+PROFILING_INTERVAL seconds. Watching costs a dict entry, so with PROFILING_SLOW_THRESHOLD set every request is
+watched and only the slow ones are kept. In "cprofile" mode requests picked by PROFILING_SAMPLE_RATE run under
+cProfile instead, which sees every call but slows the request down.
+
+Profiles are written per view name under PROFILING_DIR, keeping the newest PROFILING_MAX_PROFILES of each view.
+manage.py aggregate_profiles merges them into collapsed stacks for flamegraph.pl or speedscope.
+"""
+import cProfile
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .instrumentation import get_view_name
+
+
+def collapse_stack(frame):
+    """Frame and its callers as a collapsed stack line, outermost call first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.watched = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, ident):
+        with self.lock:
+            self.watched[ident] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+                self.thread.start()
+
+    def unwatch(self, ident):
+        with self.lock:
+            return self.watched.pop(ident, Counter())
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            idents = list(self.watched)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = collapse_stack(frame)
+                    # the request may have finished meanwhile, its counter is being written out
+                    with self.lock:
+                        if ident in self.watched:
+                            self.watched[ident][stack] += 1
+            del frames
+
+
+def view_directory(view_name):
+    return Path(settings.PROFILING_DIR) / re.sub(r"[^\w.-]", "_", view_name)
+
+
+def store_profile(view_name, duration, write, suffix):
+    """Write a profile with write(path) and drop the oldest ones of the view beyond PROFILING_MAX_PROFILES"""
+    directory = view_directory(view_name)
+    directory.mkdir(parents=True, exist_ok=True)
+    write(directory / f"{time.time_ns()}-{round(duration * 1000)}ms{suffix}")
+    profiles = sorted(directory.iterdir())
+    for path in profiles[:max(len(profiles) - settings.PROFILING_MAX_PROFILES, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def write_collapsed(stacks):
+    def write(path):
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.items()))
+    return write
+
+
+def read_collapsed(paths):
+    stacks = Counter()
+    for path in paths:
+        for line in path.read_text().splitlines():
+            stack, _, count = line.rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+class ProfilingMiddleware:
+    """Enabled with PROFILING_ENABLED, put it right after RequestMetricsMiddleware"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sampler = StackSampler(settings.PROFILING_INTERVAL)
+
+    def __call__(self, request):
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        threshold = settings.PROFILING_SLOW_THRESHOLD
+        if settings.PROFILING_MODE == "cprofile":
+            if not sampled:
+                return self.get_response(request)
+            return self.call_with_cprofile(request, threshold)
+        if not sampled and not threshold:
+            return self.get_response(request)
+        ident = threading.get_ident()
+        self.sampler.watch(ident)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = self.sampler.unwatch(ident)
+        duration = time.perf_counter() - start
+        if stacks and (sampled or duration >= threshold):
+            store_profile(get_view_name(request), duration, write_collapsed(stacks), ".collapsed")
+        return response
+
+    def call_with_cprofile(self, request, threshold):
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - start
+        if not threshold or duration >= threshold:
+            store_profile(get_view_name(request), duration, profiler.dump_stats, ".prof")
+        return response
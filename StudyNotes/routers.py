@@ -0,0 +1,126 @@
+"""
+Read replica routing.
+
+Views decorated with read_from_replica read the models of DATABASE_REPLICA_APPS from one of DATABASE_REPLICAS.
+Everything else, including auth and sessions, uses the primary. A request that writes reads from the primary for the
+rest of the request, and PrimaryPinMiddleware pins the client to the primary for DATABASE_REPLICA_PIN_SECONDS
+afterwards, so users see their own writes while the replicas catch up.
+"""
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "primary_pin"
+
+routing = ContextVar("routing", default=None)
+
+
+class RoutingState:
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = False
+        self.wrote = False
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or not state.replica or state.pinned or not settings.DATABASE_REPLICAS:
+            return None
+        if model._meta.app_label in settings.DATABASE_REPLICA_APPS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+            state.pinned = True
+        # objects read from a replica would otherwise be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    state = routing.get()
+    if state is None:
+        yield
+        return
+    previous, state.replica = state.replica, enabled
+    try:
+        yield
+    finally:
+        state.replica = previous
+
+
+def primary_reads():
+    return replica_reads(False)
+
+
+def read_from_replica(view):
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryPinMiddleware:
+    """Put it before SessionMiddleware, so every read of the request knows whether it is pinned"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        token = routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True,
+                                samesite="Lax")
+        return response
@@ -0,0 +1,17 @@
+"""
+Settings profiles: base holds what they share, dev adds the debug tooling, prod is what workers serve with and bench
+runs the benchmarks against a prod-like setup.
+
+DJANGO_SETTINGS_MODULE=StudyNotes.settings loads the profile named by STUDYNOTES_ENV, dev by default, and
+DJANGO_SETTINGS_MODULE=StudyNotes.settings.prod loads one directly without going through this module.
+"""
+import os
+from importlib import import_module
+
+PROFILES = ("dev", "prod", "bench")
+
+_profile = os.environ.get("STUDYNOTES_ENV", "dev")
+if _profile not in PROFILES:
+    raise ImportError(f"STUDYNOTES_ENV={_profile} isn't a settings profile, expected one of {', '.join(PROFILES)}")
+globals().update({name: value for name, value in vars(import_module(f"{__name__}.{_profile}")).items()
+                  if name.isupper()})
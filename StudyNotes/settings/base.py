@@ -0,0 +1,288 @@
+"""
+Settings shared by every profile, see StudyNotes.settings for how one is picked.
+"""
+import environ
+from pathlib import Path
+import os
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+env = environ.Env()
+environ.Env.read_env(BASE_DIR / "StudyNotes" / ".env")
+
+SECRET_KEY = env("SECRET_KEY")
+
+# SECURITY WARNING: don"t run with debug turned on in production!
+DEBUG = False
+ALLOWED_HOSTS = env.list("ALLOWED_HOSTS", default=[])
+
+# Application definition
+INSTALLED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "tinymce",
+    "notes.apps.NotesConfig",
+    "accounts.apps.AccountsConfig",
+    "django_cleanup.apps.CleanupConfig",
+    "captcha",
+
+]
+
+MIDDLEWARE = [
+    "StudyNotes.staticfiles.PrecompressedStaticMiddleware",
+    "StudyNotes.instrumentation.RequestMetricsMiddleware",
+    "StudyNotes.profiling.ProfilingMiddleware",
+    "StudyNotes.routers.PrimaryPinMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+ROOT_URLCONF = "StudyNotes.urls"
+
+# Templates
+TEMPLATE_LOADERS = ["django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader"]
+# compiled templates are kept in memory by every worker, off they are read and parsed again on every render
+TEMPLATES_CACHED = env.bool("TEMPLATES_CACHED", default=True)
+# compile the templates of StudyNotes.templating.WARM_UP_APPS when the WSGI/ASGI application loads, so the first
+# requests of a new worker don't pay for it
+TEMPLATES_WARM_UP = env.bool("TEMPLATES_WARM_UP", default=True)
+
+TEMPLATES = [
+    {
+        # the stock backend reporting render times to StudyNotes.instrumentation
+        "BACKEND": "StudyNotes.instrumentation.DjangoTemplates",
+        "DIRS": [],
+        "OPTIONS": {
+            "loaders": [("django.template.loaders.cached.Loader", TEMPLATE_LOADERS)] if TEMPLATES_CACHED
+            else TEMPLATE_LOADERS,
+            "context_processors": [
+                "django.template.context_processors.debug",
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+            ],
+        },
+    },
+]
+WSGI_APPLICATION = "StudyNotes.wsgi.application"
+
+# DATABASE_URL (e.g. sqlite:///bench.sqlite3) replaces the DATABASE_* settings, the benchmarks use it
+# to run without a PostgreSQL server
+DATABASES = {
+    "default": env.db("DATABASE_URL") if "DATABASE_URL" in os.environ else {
+        # the stock PostgreSQL backend plus connection pooling and connect time metrics
+        "ENGINE": "StudyNotes.postgresql",
+        "NAME": env("DATABASE_NAME"),
+        "USER": env("DATABASE_USER"),
+        "PASSWORD": env("DATABASE_PASSWORD"),
+        "HOST": env("DATABASE_HOST"),
+        "PORT": env("DATABASE_PORT"),
+        # DATABASE_POOL=on keeps up to DATABASE_POOL_MAX_SIZE connections per worker process, requests wait up to
+        # DATABASE_POOL_TIMEOUT seconds for one of them
+        "POOL": {
+            "MAX_SIZE": env.int("DATABASE_POOL_MAX_SIZE", default=10),
+            "TIMEOUT": env.float("DATABASE_POOL_TIMEOUT", default=5),
+        } if env.bool("DATABASE_POOL", default=False) else None,
+    },
+}
+# without a pool, connections are kept open for CONN_MAX_AGE seconds and reused by the next requests of the thread,
+# with one they go back to the pool after every request
+DATABASES["default"]["CONN_MAX_AGE"] = 0 if DATABASES["default"].get("POOL") \
+    else env.int("DATABASE_CONN_MAX_AGE", default=60)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool("DATABASE_CONN_HEALTH_CHECKS", default=True)
+
+# Read replicas
+# DATABASE_REPLICA_URLS=postgres://...,postgres://... adds the aliases replica0, replica1... that views decorated with
+# StudyNotes.routers.read_from_replica read the notes app from; tests read them from the default database
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[])):
+    replica = environ.Env.db_url_config(url)
+    if replica["ENGINE"] in ("django.db.backends.postgresql", "django.db.backends.postgresql_psycopg2"):
+        replica["ENGINE"] = "StudyNotes.postgresql"
+        replica["POOL"] = DATABASES["default"].get("POOL")
+    replica.update(CONN_MAX_AGE=DATABASES["default"]["CONN_MAX_AGE"],
+                   CONN_HEALTH_CHECKS=DATABASES["default"]["CONN_HEALTH_CHECKS"], TEST={"MIRROR": "default"})
+    DATABASES[f"replica{index}"] = replica
+    DATABASE_REPLICAS.append(f"replica{index}")
+DATABASE_REPLICA_APPS = ["notes"]
+# seconds a client reads from the primary after a request of theirs wrote, longer than the usual replication lag
+DATABASE_REPLICA_PIN_SECONDS = env.int("DATABASE_REPLICA_PIN_SECONDS", default=5)
+DATABASE_ROUTERS = ["StudyNotes.routers.ReplicaRouter"]
+
+# Password validation
+AUTH_USER_MODEL = "accounts.CustomUser"
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+    },
+    {
+        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
+    },
+]
+
+# Internationalization
+LANGUAGE_CODE = "en-us"
+TIME_ZONE = "UTC"
+USE_I18N = True
+USE_TZ = True
+
+# Static files (CSS, JavaScript, Images)
+STATIC_URL = "/static/"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STATICFILES_DIRS = [
+    BASE_DIR / "notes/static",
+]
+# serve STATIC_ROOT from StudyNotes.staticfiles.PrecompressedStaticMiddleware, hashed names are cached for a year
+# and the others, which can change with the next collectstatic, for STATIC_MAX_AGE seconds
+STATIC_SERVE = env.bool("STATIC_SERVE", default=False)
+STATIC_MAX_AGE = env.int("STATIC_MAX_AGE", default=3600)
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = '/media/'
+DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Notes feeds
+NOTES_PAGE_SIZE = env.int("NOTES_PAGE_SIZE", default=20)
+NOTES_MAX_PAGE_SIZE = env.int("NOTES_MAX_PAGE_SIZE", default=100)
+NOTES_SEARCH_CONFIG = env("NOTES_SEARCH_CONFIG", default="english")
+NOTES_TAG_CLOUD_SIZE = env.int("NOTES_TAG_CLOUD_SIZE", default=100)
+NOTES_TAG_AUTOCOMPLETE_LIMIT = 10
+# the in-process tag index is rebuilt after NOTES_TAG_INDEX_TTL seconds to pick up tags created by other workers
+NOTES_TAG_INDEX_ENABLED = env.bool("NOTES_TAG_INDEX_ENABLED", default=True)
+NOTES_TAG_INDEX_TTL = env.int("NOTES_TAG_INDEX_TTL", default=300)
+# route the public feed, detail, search and like URLs to notes.async_views, for ASGI deployments
+NOTES_ASYNC_VIEWS = env.bool("NOTES_ASYNC_VIEWS", default=False)
+# part of the ETags of note pages, change it when a deploy changes their HTML so browsers and the CDN refetch them
+NOTES_ETAG_SALT = env("NOTES_ETAG_SALT", default="")
+# notes fetched per server-side cursor round trip by the streaming exports
+NOTES_EXPORT_CHUNK_SIZE = env.int("NOTES_EXPORT_CHUNK_SIZE", default=500)
+# notes inserted per transaction by the imports
+NOTES_IMPORT_BATCH_SIZE = env.int("NOTES_IMPORT_BATCH_SIZE", default=500)
+# limits checked before an import reads anything, the entry ones bound what a ZIP may decompress to
+NOTES_IMPORT_MAX_SIZE = env.int("NOTES_IMPORT_MAX_SIZE", default=50 * 1024 * 1024)
+NOTES_IMPORT_MAX_ENTRIES = env.int("NOTES_IMPORT_MAX_ENTRIES", default=10000)
+NOTES_IMPORT_MAX_ENTRY_SIZE = env.int("NOTES_IMPORT_MAX_ENTRY_SIZE", default=1024 * 1024)
+
+# Cache
+# rendered note fragments live in their own cache, prod points it at Redis (NOTES_CACHE_LOCATION), run it with
+# maxmemory-policy allkeys-lru on the server
+NOTES_CACHE_ALIAS = "notes"
+NOTES_CACHE_BACKEND = env("NOTES_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache")
+
+
+def notes_cache(backend, location):
+    return {
+        "BACKEND": backend,
+        "LOCATION": location,
+        "TIMEOUT": env.int("NOTES_CACHE_TIMEOUT", default=300),
+        # LocMemCache evicts least recently used entries once MAX_ENTRIES is reached
+        "OPTIONS": {"MAX_ENTRIES": env.int("NOTES_CACHE_MAX_ENTRIES", default=5000)}
+        if backend.endswith("LocMemCache") else {},
+    }
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    NOTES_CACHE_ALIAS: notes_cache(NOTES_CACHE_BACKEND, env("NOTES_CACHE_LOCATION", default="notes")),
+}
+
+# Request metrics
+# one JSON line per request on the studynotes.requests logger and Prometheus histograms on /metrics
+REQUEST_METRICS_ENABLED = env.bool("REQUEST_METRICS_ENABLED", default=False)
+REQUEST_METRICS_SLOW_QUERIES = env.int("REQUEST_METRICS_SLOW_QUERIES", default=3)
+REQUEST_METRICS_ALLOWED_IPS = env.list("REQUEST_METRICS_ALLOWED_IPS", default=["127.0.0.1"])
+# besides the allowed IPs, /metrics wants a staff session or "Authorization: Bearer <token>"
+REQUEST_METRICS_TOKEN = env("REQUEST_METRICS_TOKEN", default="")
+
+# Request profiling, see StudyNotes.profiling
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", default=False)
+PROFILING_MODE = env("PROFILING_MODE", default="stack")  # "stack" or "cprofile"
+PROFILING_SAMPLE_RATE = env.float("PROFILING_SAMPLE_RATE", default=0.01)
+PROFILING_SLOW_THRESHOLD = env.float("PROFILING_SLOW_THRESHOLD", default=0)  # seconds, 0 keeps only sampled requests
+PROFILING_INTERVAL = env.float("PROFILING_INTERVAL", default=0.005)
+PROFILING_DIR = env("PROFILING_DIR", default=str(BASE_DIR / "profiles"))
+PROFILING_MAX_PROFILES = env.int("PROFILING_MAX_PROFILES", default=50)  # per view
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "studynotes.requests": {"handlers": ["console"], "level": env("REQUEST_METRICS_LOG_LEVEL", default="INFO"),
+                                "propagate": False},
+    },
+}
+
+# Email
+EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_HOST = env("EMAIL_HOST")
+EMAIL_FORM = env("EMAIL_FORM")
+EMAIL_HOST_USER = env("EMAIL_HOST_USER")
+EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
+EMAIL_PORT = env("EMAIL_PORT")
+EMAIL_USE_TLS = True
+PASSWORD_RESET_TIMEOUT = 14400  # 4 hours
+# outbound emails are queued by the views and sent by manage.py send_queued_mail
+EMAIL_QUEUE_MAX_ATTEMPTS = env.int("EMAIL_QUEUE_MAX_ATTEMPTS", default=5)
+EMAIL_QUEUE_RETRY_DELAY = env.int("EMAIL_QUEUE_RETRY_DELAY", default=60)  # seconds, doubled after every attempt
+EMAIL_QUEUE_MAX_RETRY_DELAY = 3600
+EMAIL_QUEUE_LEASE = env.int("EMAIL_QUEUE_LEASE", default=300)  # seconds before a crashed worker's claim is taken over
+# sent emails carry reset and activation tokens, they are deleted after this many days
+EMAIL_QUEUE_RETENTION_DAYS = env.int("EMAIL_QUEUE_RETENTION_DAYS", default=7)
+
+# Captcha
+RECAPTCHA_PUBLIC_KEY = env("RECAPTCHA_PUBLIC_KEY")
+RECAPTCHA_PRIVATE_KEY = env("RECAPTCHA_PRIVATE_KEY")
+SILENCED_SYSTEM_CHECKS = ['captcha.recaptcha_test_key_error']
+
+# Profile images
+PROFILE_IMAGE_MAX_SIZE = 1048576  # about 1 MB
+# width times height of an upload, checked from its header before anything is decoded
+PROFILE_IMAGE_MAX_PIXELS = env.int("PROFILE_IMAGE_MAX_PIXELS", default=4096 * 4096)
+# renditions in pixels, generated by the upload request with PROFILE_THUMBNAILS_ON_UPLOAD, otherwise by
+# manage.py generate_thumbnails --loop, the original is shown until they exist
+PROFILE_THUMBNAIL_SIZES = [32, 64, 150, 300]
+PROFILE_THUMBNAIL_FORMATS = ["webp", "jpeg"]  # the last one is the fallback for browsers without <picture> support
+PROFILE_THUMBNAILS_ON_UPLOAD = env.bool("PROFILE_THUMBNAILS_ON_UPLOAD", default=True)
+
+# Tinymce
+DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5 MB
+# TINYMCE_JS_URL = os.path.join(STATIC_URL, "path/to/tiny_mce/tiny_mce.js")
+TINYMCE_DEFAULT_CONFIG = {
+    "custom_undo_redo_levels": 100,
+    "selector": "textarea",
+    "menubar": "file edit view insert format tools table help",
+    "plugins": "link image preview codesample contextmenu table code lists fullscreen",
+    "toolbar1": "undo redo | backcolor casechange permanentpen formatpainter removeformat formatselect fontselect fontsizeselect",
+    "toolbar2": "bold italic underline blockquote | alignleft aligncenter alignright alignjustify "
+               "| bullist numlist | outdent indent | table | link image | codesample | preview code | tiny_mce_wiris_formulaEditor tiny_mce_wiris_formulaEditorChemistry",
+    "contextmenu": "formats | link image",
+    "block_formats": "Paragraph=p; Header 1=h1; Header 2=h2",
+    "fontsize_formats": "8pt 10pt 12pt 14pt 16pt 18pt",
+    "content_style": "body { font-family: Arial; background: white; color: black; font-size: 12pt}",
+    "codesample_languages": [
+        {"text": "Python", "value": "python"}, {"text": "HTML/XML", "value": "markup"}, ],
+    "image_class_list": [{"title": "Fluid", "value": "img-fluid", "style": {}}],
+    "width": "auto",
+    "height": "600px",
+    "image_caption": True,
+    "images_upload_url": "upload_image",
+}
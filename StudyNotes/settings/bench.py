@@ -0,0 +1,18 @@
+"""
+prod against a local SQLite database, for the benchmarks:
+
+    STUDYNOTES_ENV=bench python manage.py test benchmarks --pattern="bench_*.py"
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench.sqlite3")
+
+from .prod import *  # noqa: E402,F401,F403
+from .prod import CACHES, NOTES_CACHE_ALIAS, notes_cache  # noqa: E402
+
+# the benchmarks render pages without running collectstatic first
+STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
+STATIC_SERVE = False
+# a single process, no Redis needed
+NOTES_CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+CACHES = {**CACHES, NOTES_CACHE_ALIAS: notes_cache(NOTES_CACHE_BACKEND, "notes")}
@@ -0,0 +1,29 @@
+"""
+Local development: DEBUG, plus the debug toolbar when it is installed.
+"""
+import mimetypes
+import socket
+from importlib.util import find_spec
+
+from .base import *  # noqa: F401,F403
+from .base import INSTALLED_APPS, MIDDLEWARE, SILENCED_SYSTEM_CHECKS, env
+
+DEBUG = True
+TEMPLATES_WARM_UP = env.bool("TEMPLATES_WARM_UP", default=False)
+
+mimetypes.add_type("application/javascript", ".js", True)
+
+DEBUG_TOOLBAR = env.bool("DEBUG_TOOLBAR", default=True) and find_spec("debug_toolbar") is not None
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS = ["debug_toolbar"] + INSTALLED_APPS
+    # after the middleware that only time or route requests, before the ones whose work it reports
+    index = MIDDLEWARE.index("django.middleware.security.SecurityMiddleware")
+    MIDDLEWARE = MIDDLEWARE[:index] + ["debug_toolbar.middleware.DebugToolbarMiddleware"] + MIDDLEWARE[index:]
+    # debug_toolbar 3.8 only looks for the app_directories loader outside of the cached one
+    SILENCED_SYSTEM_CHECKS = SILENCED_SYSTEM_CHECKS + ["debug_toolbar.W006"]
+    # the gateways of the host's networks, the toolbar shows for requests from the host into a container
+    try:
+        hostname, _, ips = socket.gethostbyname_ex(socket.gethostname())
+    except OSError:
+        ips = []
+    INTERNAL_IPS = [ip[: ip.rfind(".")] + ".1" for ip in ips] + ["127.0.0.1", "10.0.2.2"]
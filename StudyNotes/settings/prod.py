@@ -0,0 +1,18 @@
+"""
+What the workers serve with: no debug apps or middleware, and nothing resolved over the network at import time.
+"""
+from .base import *  # noqa: F401,F403
+from .base import CACHES, NOTES_CACHE_ALIAS, env, notes_cache
+
+DEBUG = False
+DEBUG_TOOLBAR = False
+
+# content-hashed names plus .gz and .br variants written by collectstatic, which has to run before the workers start
+STATICFILES_STORAGE = "StudyNotes.staticfiles.CompressedManifestStaticFilesStorage"
+STATIC_SERVE = env.bool("STATIC_SERVE", default=True)
+
+# every worker has to see the same note versions, with a per-process cache a write on one worker leaves the others
+# answering 304 with the old page
+NOTES_CACHE_BACKEND = env("NOTES_CACHE_BACKEND", default="django.core.cache.backends.redis.RedisCache")
+CACHES = {**CACHES, NOTES_CACHE_ALIAS: notes_cache(NOTES_CACHE_BACKEND,
+                                                   env("NOTES_CACHE_LOCATION", default="redis://127.0.0.1:6379/1"))}
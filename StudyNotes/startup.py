@@ -0,0 +1,17 @@
+"""
+What the WSGI and ASGI entry points do once the application is loaded, before the first request.
+"""
+from django.conf import settings
+from django.db import connections
+
+from notes.autocomplete import warm_tag_index
+
+from .templating import warm_templates
+
+
+def warm_up():
+    warm_tag_index()
+    if settings.TEMPLATES_WARM_UP:
+        warm_templates()
+    # with gunicorn --preload the workers are forked from this process, they must not share its database socket
+    connections.close_all()
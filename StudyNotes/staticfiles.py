@@ -0,0 +1,133 @@
+"""
+Content-hashed static files with gzip and brotli variants, and a middleware serving them.
+
+CompressedManifestStaticFilesStorage is the stock ManifestStaticFilesStorage that also writes name.gz, and
+name.br when the brotli package is installed, next to every compressible file collectstatic copies, original and
+hashed. PrecompressedStaticMiddleware serves STATIC_ROOT with the smallest variant the client accepts. Hashed names
+never change content, so they are cached for a year as immutable; the others, e.g. the TinyMCE plugins its script
+loads by their plain names, for STATIC_MAX_AGE seconds.
+"""
+import asyncio
+import gzip
+import mimetypes
+import os
+import posixpath
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml", ".ico", ".ttf", ".eot",
+                ".otf"}
+# smaller files don't fill a packet anyway
+MIN_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def compressors():
+    """[(Content-Encoding, file suffix, compress)] in the order the middleware prefers them"""
+    found = [("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        found.insert(0, ("br", ".br", lambda data: brotli.compress(data, quality=11)))
+    return found
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE or not self.exists(name):
+                continue
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        with self.open(name) as file:
+            data = file.read()
+        for _, suffix, compress in compressors():
+            compressed_name = name + suffix
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            if len(data) < MIN_SIZE:
+                continue
+            compressed = compress(data)
+            # a variant that barely saves anything costs a decompression for nothing
+            if len(compressed) < len(data) * 0.95:
+                yield self._save(compressed_name, ContentFile(compressed))
+
+
+def accepted_encodings(request):
+    header = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    return {coding.split(";")[0].strip().lower() for coding in header.split(",")}
+
+
+class PrecompressedStaticMiddleware:
+    """Enabled with STATIC_SERVE, put it first in MIDDLEWARE so static requests skip everything else"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith("/") else f"/{settings.STATIC_URL}"
+        self.root = str(settings.STATIC_ROOT)
+        self.immutable = set(staticfiles_storage.hashed_files.values()) \
+            if isinstance(staticfiles_storage, ManifestFilesMixin) else set()
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        else:
+            self._is_coroutine = None
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        """Response for a static file, None for requests the rest of the chain handles"""
+        if request.method not in ("GET", "HEAD") or not request.path_info.startswith(self.prefix):
+            return None
+        name = posixpath.normpath(unquote(request.path_info[len(self.prefix):])).lstrip("/")
+        # like django.views.static.serve, a path escaping the root is a SuspiciousFileOperation and gets a 400
+        path = safe_join(self.root, name)
+        if not os.path.isfile(path):
+            raise Http404
+        encoding = None
+        accepted = accepted_encodings(request)
+        for coding, suffix, _ in compressors() if os.path.splitext(name)[1].lower() in COMPRESSIBLE else []:
+            if coding in accepted and os.path.isfile(path + suffix):
+                encoding, path = coding, path + suffix
+                break
+        stat = os.stat(path)
+        response = get_conditional_response(request, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = FileResponse(open(path, "rb"), filename=posixpath.basename(name),
+                                    content_type=mimetypes.guess_type(name)[0] or "application/octet-stream")
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        patch_vary_headers(response, ["Accept-Encoding"])
+        if name in self.immutable:
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.STATIC_MAX_AGE)
+        return response
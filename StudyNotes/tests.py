@@ -0,0 +1,387 @@
+import gzip
+import importlib
+import json
+import mimetypes
+import tempfile
+import threading
+import time
+import unittest
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db.utils import ConnectionDoesNotExist
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import NoReverseMatch, clear_url_caches, reverse
+
+from .instrumentation import Histogram, collect, observe_connect, render_metrics
+from .staticfiles import brotli
+from .routers import PIN_COOKIE, RoutingState, replica_reads, routing
+from .postgresql.base import get_pool, is_usable
+from .postgresql.pool import ConnectionPool, PoolTimeout, pools
+from .profiling import StackSampler
+from .templating import template_names, warm_templates
+from notes.checks import check_notes_cache_is_shared
+
+
+class HistogramTests(TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "Test.", ("view",), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(("home",), value)
+        self.assertEqual(histogram.expose()[2:], [
+            'test_seconds_bucket{view="home",le="0.1"} 2',
+            'test_seconds_bucket{view="home",le="1"} 3',
+            'test_seconds_bucket{view="home",le="+Inf"} 4',
+            'test_seconds_sum{view="home"} 3.65',
+            'test_seconds_count{view="home"} 4',
+        ])
+
+
+def reload_urls():
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_TOKEN="s3cret")
+class RequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        reload_urls()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        reload_urls()
+
+    def setUp(self):
+        caches[settings.NOTES_CACHE_ALIAS].clear()
+
+    def test_request_is_logged(self):
+        with self.assertLogs("studynotes.requests") as logs:
+            response = self.client.get(reverse("public_notes"))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "public_notes")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["response_bytes"], len(response.content))
+        self.assertGreater(entry["queries"], 0)
+        self.assertEqual(len(entry["slowest_queries"]), min(entry["queries"], 3))
+        self.assertGreater(entry["render_ms"], 0)
+
+    async def test_async_request_is_logged(self):
+        with self.assertLogs("studynotes.requests") as logs:
+            await self.async_client.get(reverse("public_notes"))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "public_notes")
+        self.assertGreater(entry["queries"], 0)
+
+    def test_metrics_endpoint(self):
+        with self.assertLogs("studynotes.requests"):
+            self.client.get(reverse("public_notes"))
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertContains(response, 'studynotes_request_queries_bucket{view="public_notes",method="GET",le="+Inf"}')
+        self.assertContains(response, 'studynotes_requests_total{view="public_notes",method="GET",status="200"}')
+
+    def test_metrics_endpoint_is_restricted(self):
+        url = reverse("metrics")
+        staff = get_user_model().objects.create_user(email='ops@user.com', password='rrr', is_staff=True)
+        with self.assertLogs("studynotes.requests"):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR="10.1.2.3", HTTP_AUTHORIZATION="Bearer s3cret")
+                             .status_code, 403)
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.client.force_login(staff)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_metrics_endpoint_is_routed_only_when_enabled(self):
+        with self.settings(REQUEST_METRICS_ENABLED=False):
+            reload_urls()
+            with self.assertRaises(NoReverseMatch):
+                reverse("metrics")
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+        reload_urls()
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_sampler_collects_stacks_of_watched_threads(self):
+        sampler = StackSampler(0.001)
+        ident = threading.get_ident()
+        sampler.watch(ident)
+        deadline = time.monotonic() + 5
+        while not sampler.watched[ident] and time.monotonic() < deadline:
+            sum(range(1000))
+        stacks = sampler.unwatch(ident)
+        self.assertTrue(any(stack.endswith("test_sampler_collects_stacks_of_watched_threads") for stack in stacks))
+
+    def test_cprofile_ring_buffer(self):
+        with self.settings(PROFILING_ENABLED=True, PROFILING_MODE="cprofile", PROFILING_SAMPLE_RATE=1,
+                           PROFILING_DIR=str(self.directory), PROFILING_MAX_PROFILES=2):
+            for _ in range(3):
+                self.client.get(reverse("public_notes"))
+        self.assertEqual(len(list((self.directory / "public_notes").glob("*.prof"))), 2)
+
+    def test_aggregate_profiles(self):
+        view = self.directory / "public_notes"
+        view.mkdir()
+        (view / "1-10ms.collapsed").write_text("main;view;query 3\nmain;view;render 1\n")
+        (view / "2-12ms.collapsed").write_text("main;view;query 2\n")
+        output = self.directory / "stacks.txt"
+        with self.settings(PROFILING_DIR=str(self.directory)):
+            call_command("aggregate_profiles", output=str(output), stderr=StringIO())
+        self.assertEqual(output.read_text(), "main;view;query 5\nmain;view;render 1\n")
+
+
+class FakeConnection:
+
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(FakeConnection, max_size=2, timeout=0.01)
+        first = pool.getconn()
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        second = pool.getconn()
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.stats(), {"in_use": 2, "idle": 0, "waiting": 0, "max_size": 2, "timeouts": 0})
+
+    def test_full_pool_times_out(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.01)
+        connection = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()["timeouts"], 1)
+        pool.putconn(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(), connection)
+
+    def test_unusable_connections_are_replaced(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.01, check=lambda connection: connection.usable)
+        connection = pool.getconn()
+        connection.usable = False
+        pool.putconn(connection)
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertTrue(connection.closed)
+
+    def test_pools_are_keyed_by_connection_parameters(self):
+        self.addCleanup(pools.clear)
+        settings_dict = {"POOL": {"MAX_SIZE": 2}, "CONN_HEALTH_CHECKS": True}
+        first = get_pool("replica", settings_dict, {"host": "db1", "user": "app"})
+        self.assertIs(get_pool("replica", settings_dict, {"user": "app", "host": "db1"}), first)
+        self.assertIsNot(get_pool("replica", settings_dict, {"host": "db2", "user": "app"}), first)
+        self.assertIsNot(get_pool("default", settings_dict, {"host": "db1", "user": "app"}), first)
+
+    def test_health_check_leaves_no_transaction_open(self):
+        connection = mock.MagicMock(autocommit=False)
+        self.assertTrue(is_usable(connection))
+        connection.rollback.assert_called_once_with()
+        connection = mock.MagicMock(autocommit=True)
+        self.assertTrue(is_usable(connection))
+        connection.rollback.assert_not_called()
+
+    def test_metrics(self):
+        for params in ("one", "two"):
+            pools[("replica", params)] = ConnectionPool(FakeConnection, max_size=2, timeout=0.01)
+            self.addCleanup(pools.pop, ("replica", params))
+        pools[("replica", "one")].getconn()
+        with collect() as metrics:
+            observe_connect("replica", True, 0.002)
+        self.assertEqual(metrics.connect_time, 0.002)
+        exposed = render_metrics()
+        self.assertIn('studynotes_db_pool_connections{alias="replica",state="in_use"} 1', exposed)
+        self.assertIn('studynotes_db_pool_max_size{alias="replica"} 4', exposed)
+        self.assertIn('studynotes_db_connection_acquire_seconds_count{alias="replica",pooled="true"} 1', exposed)
+
+
+@override_settings(DATABASE_REPLICAS=["replica0"])
+class ReplicaRoutingTests(TestCase):
+    """replica0 isn't configured, reaching it fails the request"""
+
+    def setUp(self):
+        caches[settings.NOTES_CACHE_ALIAS].clear()
+        token = routing.set(RoutingState())
+        self.addCleanup(routing.reset, token)
+
+    def test_router(self):
+        from notes.models import Notes
+        self.assertEqual(Notes.objects.all().db, "default")
+        with replica_reads():
+            self.assertEqual(Notes.objects.all().db, "replica0")
+            self.assertEqual(get_user_model().objects.all().db, "default")
+            get_user_model().objects.create_user(email="write@user.com", password="rrr")
+            # read your own writes for the rest of the request
+            self.assertEqual(Notes.objects.all().db, "default")
+
+    def test_replica_views_and_pinning(self):
+        url = reverse("search_api") + "?q=django"
+        with self.assertRaises(ConnectionDoesNotExist):
+            self.client.get(url)
+        self.assertEqual(self.client.get(reverse("public_notes")).status_code, 200)
+        self.client.force_login(get_user_model().objects.create_user(email="pin@user.com", password="rrr"))
+        with self.assertRaises(ConnectionDoesNotExist):
+            self.client.get(url)
+        response = self.client.post(reverse("profile_name_update"), {"name": "pinned"})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class TemplateWarmUpTests(TestCase):
+
+    def cached_names(self):
+        loader = engines.all()[0].engine.template_loaders[0]
+        return {template.origin.template_name for template in loader.get_template_cache.values()
+                if hasattr(template, "origin")}
+
+    def test_template_names_of_the_apps(self):
+        names = template_names()
+        self.assertIn("view_notes.html", names)
+        self.assertIn("inc/_note_card.html", names)
+        self.assertIn("update_profile_img.html", names)
+        self.assertEqual(template_names(["accounts"])[0], "inc/_profile_picture.html")
+
+    def test_warm_up_fills_the_cached_loader(self):
+        self.assertTrue(settings.TEMPLATES_CACHED)
+        engines.all()[0].engine.template_loaders[0].reset()
+        timings, errors = warm_templates()
+        self.assertEqual(errors, {})
+        self.assertEqual(set(timings), set(template_names()))
+        self.assertLessEqual(set(template_names()), self.cached_names())
+
+    def test_syntax_errors_are_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, "broken.html").write_text("{% if %}")
+            templates = [{**settings.TEMPLATES[0], "DIRS": [directory]}]
+            with override_settings(TEMPLATES=templates), \
+                    mock.patch("StudyNotes.templating.template_names", return_value=["index.html", "broken.html"]), \
+                    self.assertLogs("StudyNotes.templating", "ERROR"):
+                timings, errors = warm_templates()
+                self.assertEqual(list(timings), ["index.html"])
+                self.assertEqual(list(errors), ["broken.html"])
+                with self.assertRaisesMessage(CommandError, "1 templates could not be compiled"):
+                    call_command("warm_templates", stdout=StringIO(), stderr=StringIO())
+
+
+class WarmUpTests(TestCase):
+
+    def test_application_modules_close_the_warm_up_connections(self):
+        for module in ("StudyNotes.wsgi", "StudyNotes.asgi"):
+            with self.subTest(module=module), \
+                    mock.patch("notes.autocomplete.tag_index.warm") as warm, \
+                    mock.patch("django.db.connections.close_all") as close_all:
+                calls = mock.Mock()
+                calls.attach_mock(warm, "warm")
+                calls.attach_mock(close_all, "close_all")
+                importlib.reload(importlib.import_module(module))
+                self.assertEqual(calls.mock_calls[-2:], [mock.call.warm(), mock.call.close_all()])
+
+
+class SettingsProfileTests(TestCase):
+
+    def load(self, profile):
+        with mock.patch("socket.gethostbyname_ex", return_value=("host", [], ["172.17.0.2"])) as lookup:
+            module = importlib.reload(importlib.import_module(f"StudyNotes.settings.{profile}"))
+        return module, lookup
+
+    def test_prod_loads_no_debug_tooling(self):
+        prod, lookup = self.load("prod")
+        self.assertFalse(prod.DEBUG)
+        self.assertNotIn("debug_toolbar", prod.INSTALLED_APPS)
+        self.assertFalse([name for name in prod.MIDDLEWARE if name.startswith("debug_toolbar")])
+        lookup.assert_not_called()
+
+    def test_prod_shares_the_notes_cache_between_workers(self):
+        prod, _ = self.load("prod")
+        self.assertEqual(prod.CACHES[prod.NOTES_CACHE_ALIAS]["BACKEND"], "django.core.cache.backends.redis.RedisCache")
+        self.assertEqual(prod.CACHES[prod.NOTES_CACHE_ALIAS]["OPTIONS"], {})
+        with override_settings(CACHES=prod.CACHES):
+            self.assertEqual(check_notes_cache_is_shared(None), [])
+        with override_settings(CACHES=importlib.import_module("StudyNotes.settings.base").CACHES):
+            self.assertEqual([warning.id for warning in check_notes_cache_is_shared(None)], ["notes.W001"])
+
+    def test_dev_adds_the_toolbar(self):
+        dev, lookup = self.load("dev")
+        self.assertTrue(dev.DEBUG)
+        self.assertEqual(dev.INSTALLED_APPS[0], "debug_toolbar")
+        self.assertEqual(dev.MIDDLEWARE.index("debug_toolbar.middleware.DebugToolbarMiddleware") + 1,
+                         dev.MIDDLEWARE.index("django.middleware.security.SecurityMiddleware"))
+        self.assertIn("172.17.0.1", dev.INTERNAL_IPS)
+        # the shared lists are left alone
+        self.assertNotIn("debug_toolbar", importlib.import_module("StudyNotes.settings.base").INSTALLED_APPS)
+
+
+class PrecompressedStaticTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source, self.root = Path(directory.name, "src"), Path(directory.name, "static")
+        (source / "js").mkdir(parents=True)
+        self.script = "".join(f"function note{i}() {{ return {i}; }}\n" for i in range(200)).encode()
+        (source / "js" / "app.js").write_bytes(self.script)
+        (source / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n" + bytes(1000))
+        overrides = override_settings(
+            STATIC_ROOT=self.root, STATICFILES_DIRS=[source], STATIC_SERVE=True,
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STATICFILES_STORAGE="StudyNotes.staticfiles.CompressedManifestStaticFilesStorage",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.hashed = json.loads((self.root / "staticfiles.json").read_text())["paths"]["js/app.js"]
+
+    def test_collectstatic_writes_compressed_variants(self):
+        for name in ("js/app.js", self.hashed):
+            self.assertEqual(gzip.decompress((self.root / f"{name}.gz").read_bytes()), self.script)
+            self.assertEqual((self.root / f"{name}.br").exists(), brotli is not None)
+        self.assertFalse(list(self.root.glob("logo*.png.gz")))
+
+    def test_picks_the_variant_from_accept_encoding(self):
+        response = self.client.get(f"/static/{self.hashed}", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], mimetypes.guess_type("app.js")[0])
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.script)
+
+        response = self.client.get(f"/static/{self.hashed}", HTTP_ACCEPT_ENCODING="identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), self.script)
+
+    @unittest.skipIf(brotli is None, "brotli isn't installed")
+    def test_prefers_brotli(self):
+        response = self.client.get(f"/static/{self.hashed}", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+
+    def test_only_hashed_names_are_immutable(self):
+        response = self.client.get(f"/static/{self.hashed}")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        response = self.client.get("/static/js/app.js")
+        self.assertEqual(response["Cache-Control"], f"public, max-age={settings.STATIC_MAX_AGE}")
+        response = self.client.get("/static/js/app.js", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_files_outside_the_root_are_not_served(self):
+        self.assertEqual(self.client.get("/static/missing.js").status_code, 404)
+        with self.assertLogs("django.security.SuspiciousFileOperation"):
+            self.assertEqual(self.client.get("/static/%2e%2e/src/js/app.js").status_code, 400)
+        self.assertEqual(self.client.get("/static/js/").status_code, 404)
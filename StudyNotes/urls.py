@@ -3,14 +3,20 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .instrumentation import metrics_view
+
 urlpatterns = [
     path("", include("notes.urls")),
     path("accounts/", include("accounts.urls")),
     path('tinymce/', include('tinymce.urls')),
     path('admin/', admin.site.urls),
-    path('__debug__/', include('debug_toolbar.urls')),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
+if settings.REQUEST_METRICS_ENABLED:
+    urlpatterns.append(path("metrics", metrics_view, name="metrics"))
+
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,12 +1,14 @@
-import imghdr
 from captcha.fields import ReCaptchaField
 from captcha.widgets import ReCaptchaV2Checkbox
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm, SetPasswordForm, PasswordResetForm, \
     AuthenticationForm
 from django.core.exceptions import ValidationError
 from django import forms
 
+from accounts.uploads import HEADER_LIMIT, read_image_header
+
 
 class CustomUserCreationForm(UserCreationForm):
 
@@ -63,29 +65,42 @@ class ProfileImageForm(forms.ModelForm):
         model = get_user_model()
         fields = ("profile_img",)
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
     def clean_profile_img(self):
         image_types = {'jpeg': 'image/jpeg',
                        'jpg': 'image/jpeg',
                        'png': 'image/png',
                        }
-        img_max_size = 1048576  # about 1Mb
         img = self.cleaned_data.get("profile_img")
         if img is None:
             return img
 
-        if img.size > img_max_size:
+        if img.size > settings.PROFILE_IMAGE_MAX_SIZE:
             raise ValidationError("The file is too big.")
 
         img_extension = img.name.split('.')[-1]
         if not img_extension or img_extension.lower() not in image_types.keys():
             raise ValidationError("Wrong extension of the image")
 
-        mime_type = imghdr.what(img)
-        if mime_type not in image_types.keys():
-            raise ValidationError("Wrong mime-type of the image")
+        # ProfileImageUploadHandler has checked the header already, uploads it didn't handle are checked here
+        if not hasattr(img, "image_format"):
+            img.seek(0)
+            read_image_header(img.read(HEADER_LIMIT), complete=True)
+            img.seek(0)
 
         return img
 
+    def clean(self):
+        error = self.upload_errors.get("profile_img")
+        if error:
+            # the rejected file never made it into request.FILES, replace the "required" error
+            self.errors.pop("profile_img", None)
+            self.add_error("profile_img", error)
+        return super().clean()
+
 
 class PasswordSetForm(SetPasswordForm):
     captcha = ReCaptchaField(widget=ReCaptchaV2Checkbox())
@@ -0,0 +1,12 @@
+from django.dispatch import receiver
+from django_cleanup.signals import cleanup_post_delete
+
+from .models import CustomUser
+from .thumbnails import delete_thumbnails
+
+
+@receiver(cleanup_post_delete, sender=CustomUser)
+def delete_thumbnails_with_image(sender, field_name, file_name, file, success, **kwargs):
+    # django_cleanup removes a replaced or orphaned upload after the commit, its renditions go with it
+    if field_name == "profile_img" and success:
+        delete_thumbnails(file.storage, file_name)
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import OutboundEmail
+
+
+def enqueue_email(subject, body, to):
+    """Store the email for the send_queued_mail worker instead of talking to SMTP inside the request"""
+    return OutboundEmail.objects.create(subject=subject, body=body, to=",".join(to))
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1),
+                                 settings.EMAIL_QUEUE_MAX_RETRY_DELAY))
+
+
+def claim_emails(batch_size):
+    """
+    Mark a batch of due emails as sending until now + EMAIL_QUEUE_LEASE, the row locks only last for this transaction.
+    Sending rows whose lease is over were claimed by a worker that died and are due again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(OutboundEmail.objects.select_for_update(skip_locked=True)
+                     .filter(status__in=["pending", "sending"], next_attempt_at__lte=now)
+                     .order_by("next_attempt_at")[:batch_size])
+        for email in batch:
+            email.status = "sending"
+            email.next_attempt_at = now + timedelta(seconds=settings.EMAIL_QUEUE_LEASE)
+        OutboundEmail.objects.bulk_update(batch, ["status", "next_attempt_at"])
+    return batch
+
+
+def send_queued_emails(batch_size=50):
+    """
+    Send one batch of due emails over a single connection, returns (sent, failed) counts.
+    The batch is claimed first, SMTP is talked to outside any transaction.
+    """
+    sent = failed = 0
+    batch = claim_emails(batch_size)
+    if not batch:
+        return sent, failed
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        connection = None
+        open_error = exc
+    for email in batch:
+        email.attempts += 1
+        try:
+            if connection is None:
+                raise open_error
+            connection.send_messages([EmailMessage(email.subject, email.body, to=email.to.split(","))])
+        except Exception as exc:
+            failed += 1
+            email.last_error = f"{type(exc).__name__}: {exc}"
+            if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+                email.status = "failed"
+            else:
+                email.status = "pending"
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        else:
+            sent += 1
+            email.status = "sent"
+            email.sent_at = timezone.now()
+            email.last_error = ""
+    if connection is not None:
+        connection.close()
+    OutboundEmail.objects.bulk_update(batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"])
+    return sent, failed
+
+
+def purge_sent_emails():
+    """Delete emails sent more than EMAIL_QUEUE_RETENTION_DAYS ago, returns how many"""
+    cutoff = timezone.now() - timedelta(days=settings.EMAIL_QUEUE_RETENTION_DAYS)
+    return OutboundEmail.objects.filter(status="sent", sent_at__lt=cutoff).delete()[0]
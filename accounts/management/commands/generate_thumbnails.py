@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.thumbnails import generate_stale_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Make the missing profile image renditions, of images uploaded since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--loop", action="store_true", help="keep polling for new images")
+        parser.add_argument("--interval", type=float, default=5, help="seconds to sleep when nothing is stale")
+
+    def handle(self, *args, **options):
+        while True:
+            generated = generate_stale_thumbnails(options["batch_size"])
+            if generated:
+                self.stdout.write(f"generated thumbnails of {generated} images")
+            if not options["loop"]:
+                break
+            if not generated:
+                time.sleep(options["interval"])
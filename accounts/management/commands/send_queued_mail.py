@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import purge_sent_emails, send_queued_emails
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = "Send queued outbound emails in batches over a reused SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--loop", action="store_true", help="keep polling the queue")
+        parser.add_argument("--interval", type=float, default=5, help="seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        purged_at = None
+        while True:
+            if purged_at is None or time.monotonic() - purged_at > PURGE_INTERVAL:
+                purged = purge_sent_emails()
+                purged_at = time.monotonic()
+                if purged:
+                    self.stdout.write(f"purged {purged} sent emails")
+            sent, failed = send_queued_emails(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"sent {sent}, failed {failed}")
+            if not options["loop"]:
+                break
+            if not sent and not failed:
+                time.sleep(options["interval"])
@@ -14,6 +14,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return None
 
     profile_img = models.ImageField(upload_to=user_dir_path, blank=True, null=True, max_length=255)
+    # paths of the renditions made by accounts.thumbnails and the upload they were made from
+    profile_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     name = models.CharField(default="No name", null=True, blank=False, max_length=40)
     email = models.EmailField(_('email address'), unique=True, max_length=100)
     is_staff = models.BooleanField(default=False)
@@ -27,3 +29,31 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return f"{self.email}"
+
+
+EMAIL_STATUS_CHOICES = (
+    ("pending", "Pending"),
+    ("sending", "Sending"),
+    ("sent", "Sent"),
+    ("failed", "Failed"),
+    )
+
+
+class OutboundEmail(models.Model):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    to = models.TextField(help_text="comma separated recipients")
+    status = models.CharField(choices=EMAIL_STATUS_CHOICES, max_length=8, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbound_email_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to}"
@@ -0,0 +1,10 @@
+from django import template
+
+from accounts.thumbnails import profile_picture as get_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag("inc/_profile_picture.html")
+def profile_picture(user, width):
+    return {"user": user, "width": width, "sources": get_sources(user, width) if user.profile_img else None}
@@ -1,3 +1,202 @@
-from django.test import TestCase
+import shutil
+import struct
+import tempfile
+import zlib
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts.mail import enqueue_email, purge_sent_emails, send_queued_emails
+from accounts.models import CustomUser, OutboundEmail
+from accounts.thumbnails import rendition_names, stale_thumbnails
+from accounts.uploads import ProfileImageUploadHandler, read_image_header
+
+
+class OutboundEmailTests(TestCase):
+
+    def test_queued_emails_are_sent_over_one_connection(self):
+        enqueue_email("first", "body", to=["one@user.com"])
+        enqueue_email("second", "body", to=["two@user.com", "three@user.com"])
+        self.assertEqual(len(mail.outbox), 0)
+        with mock.patch("accounts.mail.get_connection", wraps=mail.get_connection) as get_connection:
+            call_command("send_queued_mail", stdout=mock.MagicMock())
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual([message.to for message in mail.outbox],
+                         [["one@user.com"], ["two@user.com", "three@user.com"]])
+        self.assertFalse(OutboundEmail.objects.exclude(status="sent").exists())
+
+    def test_failed_sends_are_retried_with_backoff(self):
+        email = enqueue_email("flaky", "body", to=["flaky@user.com"])
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=OSError("down")):
+            self.assertEqual(send_queued_emails(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("pending", 1))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            self.assertEqual(send_queued_emails(), (0, 0))
+            for _ in range(4):
+                OutboundEmail.objects.update(next_attempt_at=timezone.now())
+                send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("failed", 5))
+        self.assertIn("down", email.last_error)
+
+    def test_emails_are_claimed_before_sending(self):
+        email = enqueue_email("claimed", "body", to=["claimed@user.com"])
+
+        def send_messages(messages):
+            claimed = OutboundEmail.objects.get(pk=email.pk)
+            self.assertEqual(claimed.status, "sending")
+            self.assertGreater(claimed.next_attempt_at, timezone.now())
+            # another worker finds nothing due while the lease runs
+            self.assertEqual(send_queued_emails(), (0, 0))
+            return len(messages)
+
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=send_messages):
+            self.assertEqual(send_queued_emails(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, "sent")
+
+    def test_expired_claims_are_taken_over(self):
+        email = enqueue_email("orphaned", "body", to=["orphaned@user.com"])
+        OutboundEmail.objects.update(status="sending", next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, "sent")
+
+    @override_settings(EMAIL_QUEUE_RETENTION_DAYS=7)
+    def test_old_sent_emails_are_purged(self):
+        for subject in ("old", "recent", "pending"):
+            enqueue_email(subject, "body", to=["purge@user.com"])
+        OutboundEmail.objects.filter(subject="old").update(status="sent", sent_at=timezone.now() - timedelta(days=8))
+        OutboundEmail.objects.filter(subject="recent").update(status="sent", sent_at=timezone.now() - timedelta(days=6))
+        self.assertEqual(purge_sent_emails(), 1)
+        self.assertEqual(set(OutboundEmail.objects.values_list("subject", flat=True)), {"recent", "pending"})
+
+
+def make_image(name="photo.png", size=(640, 480), color="red"):
+    buffer = BytesIO()
+    Image.new("RGBA", size, color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ThumbnailTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(email="thumbs@user.com", password="rrr")
+        self.client.force_login(self.user)
+
+    def upload(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("profile_img_update"), {"profile_img": image})
+        self.assertEqual(response.status_code, 302)
+        self.user.refresh_from_db()
+        return self.user.profile_img.name
+
+    def test_renditions_are_made_by_the_upload(self):
+        source = self.upload(make_image())
+        self.assertNotIn(self.user, stale_thumbnails())
+        response = self.client.get(reverse("profile"))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, "thumbnails/photo-150.jpeg 1x")
+        self.assertContains(response, "thumbnails/photo-300.jpeg 2x")
+        self.assertNotContains(response, f'src="/media/{source}"')
+        with Image.open(Path(self.media_root) / self.user.profile_thumbnails["renditions"]["64"]["webp"]) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (64, 64)))
+        # session, user and profile stats, the renditions are not made again
+        with self.assertNumQueries(3):
+            self.client.get(reverse("profile"))
+
+    @override_settings(PROFILE_THUMBNAILS_ON_UPLOAD=False)
+    def test_worker_makes_renditions_and_cleanup_removes_them(self):
+        source = self.upload(make_image())
+        self.assertContains(self.client.get(reverse("profile")), f'src="/media/{source}"')
+        out = StringIO()
+        call_command("generate_thumbnails", stdout=out)
+        self.assertIn("generated thumbnails of 1 images", out.getvalue())
+        self.assertContains(self.client.get(reverse("profile")), "thumbnails/photo-150.webp 1x")
+        old = [Path(self.media_root) / name for name in rendition_names(source)]
+        self.assertTrue(all(path.exists() for path in old))
+
+        self.upload(make_image("other.png", color="blue"))
+        self.assertFalse(any(path.exists() for path in old))
+        self.assertIn(self.user, stale_thumbnails())
+
+    def test_changed_sizes_or_formats_make_renditions_stale(self):
+        source = self.upload(make_image())
+        for changed in ({"PROFILE_THUMBNAIL_SIZES": [32, 48, 64, 150, 300]},
+                        {"PROFILE_THUMBNAIL_FORMATS": ["avif", "webp", "jpeg"]}):
+            with self.subTest(**changed), override_settings(**changed):
+                self.assertIn(self.user, stale_thumbnails())
+                response = self.client.get(reverse("profile"))
+                self.assertContains(response, f'src="/media/{source}"')
+                self.assertNotContains(response, "<source")
+        with override_settings(PROFILE_THUMBNAIL_SIZES=[48, 96]):
+            call_command("generate_thumbnails", stdout=StringIO())
+            self.assertNotIn(self.user, stale_thumbnails())
+            self.assertContains(self.client.get(reverse("profile")), "thumbnails/photo-96.webp 1x")
+        self.assertIn(self.user, stale_thumbnails())
+
+
+def png_header(width, height):
+    """A PNG that claims the given dimensions, its pixel data is garbage"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", b"\0" * 1000) + chunk(b"IEND", b"")
+
+
+class ProfileImageUploadTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="upload@user.com", password="rrr")
+        self.client.force_login(self.user)
+
+    def upload(self, name, content):
+        with mock.patch("accounts.uploads.InMemoryUploadedFile") as stored:
+            response = self.client.post(reverse("profile_img_update"),
+                                        {"profile_img": SimpleUploadedFile(name, content)})
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_img)
+        self.assertFalse(stored.called)
+        return response
+
+    def test_header_is_read_from_the_first_bytes(self):
+        self.assertIsNone(read_image_header(b"\x89PN"))
+        # Pillow reads PNG chunks up to the first IDAT, not its pixel data
+        self.assertIsNone(read_image_header(png_header(640, 480)[:40]))
+        self.assertEqual(read_image_header(png_header(640, 480)[:60]), ("PNG", (640, 480)))
+        self.assertEqual(read_image_header(make_image().read()), ("PNG", (640, 480)))
+
+    def test_decompression_bombs_are_rejected_from_the_header(self):
+        self.assertContains(self.upload("bomb.png", png_header(50000, 50000)), "The image has too many pixels.")
+        with override_settings(PROFILE_IMAGE_MAX_PIXELS=100 * 100):
+            self.assertContains(self.upload("big.png", png_header(200, 200)), "The image has too many pixels.")
+
+    def test_oversized_and_fake_images_are_rejected(self):
+        with mock.patch("accounts.uploads.StopUpload", wraps=StopUpload) as stop:
+            self.assertContains(self.upload("huge.png", png_header(64, 64) + b"\0" * 1100000), "The file is too big.")
+        stop.assert_called_once_with(connection_reset=False)
+        self.assertContains(self.upload("fake.png", b"GIF89a" + b"\0" * 100), "Wrong mime-type of the image")
+
+    def test_bodies_over_the_limit_are_rejected_before_their_file_is_read(self):
+        with mock.patch("accounts.uploads.StopUpload", wraps=StopUpload) as stop, \
+                mock.patch.object(ProfileImageUploadHandler, "receive_data_chunk") as receive:
+            self.assertContains(self.upload("huge.png", png_header(64, 64) + b"\0" * 1200000), "The file is too big.")
+            self.assertContains(self.upload("huger.png", png_header(64, 64) + b"\0" * 3000000), "The file is too big.")
+        receive.assert_not_called()
+        self.assertEqual(stop.call_args_list, [mock.call(connection_reset=False), mock.call(connection_reset=True)])
@@ -0,0 +1,130 @@
+"""
+Square renditions of profile images, PROFILE_THUMBNAIL_SIZES pixels wide in each PROFILE_THUMBNAIL_FORMATS.
+
+Renditions are stored next to the upload, under Users/<pk>/thumbnails/, with names derived from the upload's name,
+and CustomUser.profile_thumbnails caches their paths together with the upload, sizes and formats they were made from.
+When that upload is no longer the current one, or the settings changed, the renditions are stale: with
+PROFILE_THUMBNAILS_ON_UPLOAD the upload request makes them once it has committed, and the generate_thumbnails worker
+picks up the rest. Pages never make them while they render, they show the original until the renditions exist.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+from PIL import Image, ImageOps
+
+from accounts.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def rendition_name(source, size, fmt):
+    directory, filename = posixpath.split(source)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, "thumbnails", f"{stem}-{size}.{fmt}")
+
+
+def rendition_names(source):
+    return [rendition_name(source, size, fmt)
+            for size in settings.PROFILE_THUMBNAIL_SIZES for fmt in settings.PROFILE_THUMBNAIL_FORMATS]
+
+
+def rendition_settings():
+    return {"sizes": list(settings.PROFILE_THUMBNAIL_SIZES), "formats": list(settings.PROFILE_THUMBNAIL_FORMATS)}
+
+
+def is_current(user):
+    thumbnails = user.profile_thumbnails
+    return bool(user.profile_img) and thumbnails.get("source") == user.profile_img.name \
+        and all(thumbnails.get(key) == value for key, value in rendition_settings().items())
+
+
+def render(image, size, fmt):
+    thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    if fmt == "jpeg" and thumbnail.mode != "RGB":
+        # JPEG has no alpha, transparent pixels become white instead of black
+        background = Image.new("RGB", thumbnail.size, "white")
+        background.paste(thumbnail, mask=thumbnail.getchannel("A") if "A" in thumbnail.getbands() else None)
+        thumbnail = background
+    buffer = BytesIO()
+    thumbnail.save(buffer, **SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def generate_thumbnails(user):
+    """Render and store every rendition of the user's profile image and cache their paths on the user"""
+    source = user.profile_img.name
+    storage = user.profile_img.storage
+    renditions = {}
+    try:
+        with user.profile_img.open("rb") as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        for size in settings.PROFILE_THUMBNAIL_SIZES:
+            for fmt in settings.PROFILE_THUMBNAIL_FORMATS:
+                name = rendition_name(source, size, fmt)
+                storage.delete(name)
+                renditions.setdefault(str(size), {})[fmt] = storage.save(name, ContentFile(render(image, size, fmt)))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # the original keeps being served, the worker doesn't retry until a new image is uploaded
+        logger.exception("Could not make thumbnails of %s", source)
+        renditions = {}
+    user.profile_thumbnails = {"source": source, **rendition_settings(), "renditions": renditions}
+    # a newer upload saved meanwhile keeps its own, stale, cache
+    CustomUser.objects.filter(pk=user.pk, profile_img=source).update(profile_thumbnails=user.profile_thumbnails)
+    return renditions
+
+
+def delete_thumbnails(storage, source):
+    for name in rendition_names(source):
+        storage.delete(name)
+
+
+def stale_thumbnails():
+    changed_settings = Q()
+    for key, value in rendition_settings().items():
+        changed_settings |= Q(**{f"profile_thumbnails__{key}__isnull": True}) \
+            | ~Q(**{f"profile_thumbnails__{key}": value})
+    return CustomUser.objects.exclude(profile_img="").exclude(profile_img=None)\
+        .annotate(thumbnail_source=KeyTextTransform("source", "profile_thumbnails"))\
+        .filter(Q(thumbnail_source__isnull=True) | ~Q(thumbnail_source=F("profile_img")) | changed_settings)
+
+
+def generate_stale_thumbnails(batch_size=20):
+    users = list(stale_thumbnails().order_by("pk")[:batch_size])
+    for user in users:
+        generate_thumbnails(user)
+    return len(users)
+
+
+def pick_size(width):
+    """Smallest rendition at least width pixels wide, or the largest one"""
+    sizes = sorted(settings.PROFILE_THUMBNAIL_SIZES)
+    return next((size for size in sizes if size >= width), sizes[-1])
+
+
+def profile_picture(user, width):
+    """
+    Sources of a <picture> showing the profile image at width CSS pixels, the last one is the <img> fallback.
+    None when the original has to be shown.
+    """
+    # no queries or storage writes here, the tag renders inside async views too
+    if not is_current(user):
+        return None
+    renditions = user.profile_thumbnails.get("renditions") or {}
+    single, double = renditions.get(str(pick_size(width)), {}), renditions.get(str(pick_size(width * 2)), {})
+    if not all(fmt in single and fmt in double for fmt in settings.PROFILE_THUMBNAIL_FORMATS):
+        return None
+    storage = user.profile_img.storage
+    return [{"type": f"image/{fmt}", "src": storage.url(single[fmt]),
+             "srcset": f"{storage.url(single[fmt])} 1x, {storage.url(double[fmt])} 2x"}
+            for fmt in settings.PROFILE_THUMBNAIL_FORMATS]
@@ -0,0 +1,112 @@
+"""
+Validation of profile image uploads from their first bytes.
+
+ProfileImageUploadHandler keeps the upload in memory and reads the format and dimensions from the header bytes as
+the chunks arrive, with Image.open, which parses headers without decoding or allocating pixels. An upload over
+PROFILE_IMAGE_MAX_SIZE, that isn't a JPEG or PNG, or whose dimensions are over PROFILE_IMAGE_MAX_PIXELS, stops being
+stored right there, so a decompression bomb never reaches Pillow's decoders, the disk or the worker's memory. A body
+whose Content-Length is already over the limit is rejected before its file is read.
+"""
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from PIL import Image
+
+MAGIC_NUMBERS = {b"\xff\xd8\xff": "JPEG", b"\x89PNG\r\n\x1a\n": "PNG"}
+# a JPEG can put EXIF and ICC segments before the frame header that holds its dimensions
+HEADER_LIMIT = 256 * 1024
+# room for the CSRF token, the part headers and the boundaries around the file in the request body
+FORM_OVERHEAD = 64 * 1024
+
+
+def read_image_header(data, complete=False):
+    """
+    (format, (width, height)) of an image from its first bytes, None while more bytes are needed.
+    Raises ValidationError for files that are not a JPEG or PNG or have more pixels than the budget.
+    """
+    kind = next((kind for magic, kind in MAGIC_NUMBERS.items() if data.startswith(magic)), None)
+    if kind is None:
+        if not complete and len(data) < max(map(len, MAGIC_NUMBERS)):
+            return None
+        raise ValidationError("Wrong mime-type of the image")
+    try:
+        with warnings.catch_warnings():
+            # over MAX_IMAGE_PIXELS Pillow warns, the budget below is the limit that applies
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(BytesIO(data[:HEADER_LIMIT]), formats=[kind]) as image:
+                size = image.size
+    except Image.DecompressionBombError:
+        raise ValidationError("The image has too many pixels.")
+    except (OSError, SyntaxError, ValueError):
+        if not complete and len(data) < HEADER_LIMIT:
+            return None
+        raise ValidationError("The image could not be read.")
+    width, height = size
+    if width * height > settings.PROFILE_IMAGE_MAX_PIXELS:
+        raise ValidationError("The image has too many pixels.")
+    return kind, size
+
+
+class ProfileImageUploadHandler(FileUploadHandler):
+    """
+    Install it in front of the default handlers before request.POST or request.FILES is read. Files of other fields
+    go on to the next handlers. Rejections end up in request.upload_errors, keyed by field name.
+    """
+
+    def __init__(self, request=None, field_name="profile_img"):
+        super().__init__(request)
+        self.image_field = field_name
+        self.active = False
+        self.body_length = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.body_length = content_length
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == self.image_field
+        self.buffer = BytesIO()
+        self.header = None
+        if self.active and self.body_length > settings.PROFILE_IMAGE_MAX_SIZE + FORM_OVERHEAD:
+            self.reject("The file is too big.")
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if start + len(raw_data) > settings.PROFILE_IMAGE_MAX_SIZE:
+            self.reject("The file is too big.")
+        self.buffer.write(raw_data)
+        if self.header is None:
+            self.header = self.read_header(complete=False)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+        if self.header is None:
+            self.header = self.read_header(complete=True)
+        self.buffer.seek(0)
+        file = InMemoryUploadedFile(self.buffer, self.field_name, self.file_name, self.content_type, file_size,
+                                    self.charset, self.content_type_extra)
+        file.image_format, file.image_size = self.header
+        return file
+
+    def read_header(self, complete):
+        try:
+            return read_image_header(self.buffer.getvalue(), complete)
+        except ValidationError as exc:
+            self.reject(exc.message)
+
+    def reject(self, message):
+        self.active = False
+        self.buffer = BytesIO()
+        if self.request is not None:
+            self.request.upload_errors = {**getattr(self.request, "upload_errors", {}), self.image_field: message}
+        # the rest of a body up to twice the limit is read and thrown away, so the browser still gets the form back with
+        # the error, a bigger one isn't worth reading and the connection is dropped
+        raise StopUpload(connection_reset=self.body_length > 2 * settings.PROFILE_IMAGE_MAX_SIZE)
@@ -1,26 +1,44 @@
 from django.contrib.auth import logout, login, get_user_model, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
+from django.conf import settings
 from django.contrib import messages
-from django.core.mail import EmailMessage
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import render, get_object_or_404, redirect
 from django.template.loader import render_to_string
 from django.utils.encoding import force_str, force_bytes
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from accounts.froms import PassResetForm, PasswordSetForm, CustomUserCreationForm, CustomUserLoginForm, \
     ProfileUsernameForm, ProfileImageForm
+from accounts.mail import enqueue_email
 from accounts.models import CustomUser
+from accounts.thumbnails import generate_thumbnails
 from accounts.tokens import account_activation_token
+from accounts.uploads import ProfileImageUploadHandler
 
 
 @login_required
+@csrf_exempt
 def update_profile_img(request):
+    # the handler has to be in place before CSRF protection reads request.POST
+    request.upload_handlers.insert(0, ProfileImageUploadHandler(request))
+    return update_profile_img_protected(request)
+
+
+@csrf_protect
+def update_profile_img_protected(request):
     user_obj = get_object_or_404(CustomUser, email=request.user.email)
-    form = ProfileImageForm(request.POST or None, request.FILES or None, instance=user_obj)
+    # a rejected upload leaves POST and FILES empty, the form is still bound to show the error
+    posted = request.method == "POST"
+    form = ProfileImageForm(request.POST if posted else None, request.FILES if posted else None, instance=user_obj,
+                            upload_errors=getattr(request, "upload_errors", None))
     if request.method == "POST":
         if form.is_valid():
             form.save()
+            if settings.PROFILE_THUMBNAILS_ON_UPLOAD and user_obj.profile_img:
+                transaction.on_commit(lambda: generate_thumbnails(user_obj))
             messages.success(request, "Profile image has been updated")
             return redirect('profile')
     return render(request, "update_profile_img.html", {"form": form})
@@ -70,19 +88,16 @@ def password_reset_request(request):
                     "token": account_activation_token.make_token(associated_user),
                     "protocol": "https" if request.is_secure() else "http"
                 })
-                email = EmailMessage(subject, message, to=[associated_user.email])
-                if email.send():
-                    messages.success(request,
-                    """
-                        Password reset sent.
-                        We've emailed you instructions for setting your password,
-                        if an account exists with the email you entered.
-                        You should receive them shortly. If you don't receive an email,
-                        please make sure you've entered the  address you registered with, and check your spam folder.
-                    """
-                                     )
-                else:
-                    messages.error(request, "Problem sending reset password email")
+                enqueue_email(subject, message, to=[associated_user.email])
+                messages.success(request,
+                """
+                    Password reset sent.
+                    We've emailed you instructions for setting your password,
+                    if an account exists with the email you entered.
+                    You should receive them shortly. If you don't receive an email,
+                    please make sure you've entered the  address you registered with, and check your spam folder.
+                """
+                                 )
             return redirect("home")
 
         for key, error in form.errors.items():
@@ -147,13 +162,10 @@ def activate_email(request, user, to_email):
         "token": account_activation_token.make_token(user),
         "protocol": "https" if request.is_secure() else "http"
     })
-    email = EmailMessage(mail_subject, message, to=[to_email])
-    if email.send():
-        messages.success(request,
-                         f"{user}, please go to your email, {to_email} inbox and click on received activation link to"
-                         f" confirm and complete the registration. Note: Check your spam folder.")
-    else:
-        messages.error(request, f"Problem sending confirmation email to {to_email}, check if you typed it correctly")
+    enqueue_email(mail_subject, message, to=[to_email])
+    messages.success(request,
+                     f"{user}, please go to your email, {to_email} inbox and click on received activation link to"
+                     f" confirm and complete the registration. Note: Check your spam folder.")
 
 
 def register(request):
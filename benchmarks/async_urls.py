@@ -0,0 +1,13 @@
+"""The project URLs with the read-heavy notes URLs routed to notes.async_views, as NOTES_ASYNC_VIEWS does"""
+from django.urls import path
+
+from StudyNotes.urls import urlpatterns as project_urlpatterns
+from notes import async_views
+
+urlpatterns = [
+    path("public_notes/", async_views.view_all_public_notes, name="public_notes"),
+    path("public_notes/detail_view/<int:pk>/", async_views.public_note_detail_view, name="public_detail_view"),
+    path("like", async_views.like_view, name="like_note"),
+    path("search/", async_views.search_view, name="search"),
+    path("api/search/", async_views.search_api, name="search_api"),
+] + project_urlpatterns
@@ -0,0 +1,116 @@
+"""
+Throughput of the read-heavy views under WSGI with a thread per request and under ASGI, with the sync views and
+with notes.async_views.
+
+    DATABASE_URL=sqlite:///bench.sqlite3 python manage.py test benchmarks --pattern="bench_servers.py"
+
+The handlers are called in-process: WSGI from a pool of BENCH_CONCURRENCY threads like a gthread worker, ASGI from
+BENCH_CONCURRENCY concurrent tasks on one event loop like a uvicorn worker. SQLite answers in microseconds, so the
+gap the async views make only shows against a PostgreSQL server where requests wait on the network.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .datasets import DATASETS, seed_dataset
+
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 50))
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", 500))
+
+
+def wsgi_call(application, url):
+    path, _, query = url.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SCRIPT_NAME": "",
+        "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "HTTP_HOST": "testserver",
+        "REMOTE_ADDR": "127.0.0.1", "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+        "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False, "wsgi.version": (1, 0),
+    }
+    statuses = []
+    start = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b"".join(response)
+    response.close()
+    return int(statuses[0].split()[0]), time.perf_counter() - start
+
+
+async def asgi_call(application, url):
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    statuses = []
+
+    async def receive():
+        return messages.pop() if messages else await asyncio.Future()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    start = time.perf_counter()
+    await application(scope, receive, send)
+    return statuses[0], time.perf_counter() - start
+
+
+def run_wsgi(urls):
+    application = WSGIHandler()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        return list(pool.map(lambda url: wsgi_call(application, url), urls))
+
+
+async def run_asgi(urls):
+    application = ASGIHandler()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def call(url):
+        async with semaphore:
+            return await asgi_call(application, url)
+
+    return await asyncio.gather(*(call(url) for url in urls))
+
+
+# the debug toolbar middleware is sync only, it would put every ASGI request back on a thread
+@override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE if not name.startswith("debug_toolbar")])
+class ServerBenchmarks(TransactionTestCase):
+
+    def test_wsgi_and_asgi_throughput(self):
+        users, notes = seed_dataset(**DATASETS["medium"])
+        public_note = next(note for note in notes if note.is_public)
+        endpoints = {
+            "public_notes": reverse("public_notes"),
+            "public_detail_view": reverse("public_detail_view", args=[public_note.pk]),
+            "search_api": reverse("search_api") + "?q=lorem",
+        }
+        servers = {
+            "wsgi, sync views": lambda urls: run_wsgi(urls),
+            "asgi, sync views": lambda urls: asyncio.run(run_asgi(urls)),
+            "asgi, async views": lambda urls: self.run_with_async_views(urls),
+        }
+        print(f"\n{CONCURRENCY} concurrent clients, {REQUESTS} requests")
+        for endpoint, url in endpoints.items():
+            for server, run in servers.items():
+                start = time.perf_counter()
+                results = run([url] * REQUESTS)
+                elapsed = time.perf_counter() - start
+                self.assertEqual({status for status, _ in results}, {200}, f"{server} {endpoint}")
+                latencies = sorted(duration for _, duration in results)
+                print(f"  {endpoint:<20} {server:<18} {REQUESTS / elapsed:8.1f} req/s  "
+                      f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms  "
+                      f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms")
+
+    def run_with_async_views(self, urls):
+        with override_settings(ROOT_URLCONF="benchmarks.async_urls"):
+            return asyncio.run(run_asgi(urls))
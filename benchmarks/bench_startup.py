@@ -0,0 +1,90 @@
+"""
+Startup time of a worker for each settings profile, to track across releases.
+
+    python manage.py test benchmarks --pattern="bench_startup.py"
+
+Every profile boots BENCH_STARTUP_RUNS fresh interpreters that import the settings, run django.setup() and build
+the WSGI handler, which loads the middleware, and once more under python -X importtime for the modules that take
+the longest to import. BENCH_STARTUP_OUTPUT=startup.json writes the numbers out as JSON. The profiles read the same
+environment as this process, e.g. the .env file, and nothing here touches a database.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from StudyNotes.settings import PROFILES
+
+RUNS = int(os.environ.get("BENCH_STARTUP_RUNS", 5))
+OUTPUT = os.environ.get("BENCH_STARTUP_OUTPUT")
+TOP_IMPORTS = 10
+
+BOOT = """
+import json, sys, time
+start = time.perf_counter()
+from django.conf import settings
+settings.INSTALLED_APPS
+settings_done = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+print(json.dumps({"settings": settings_done - start, "setup": setup_done - settings_done,
+                  "handler": time.perf_counter() - setup_done, "modules": len(sys.modules),
+                  "debug_toolbar": "debug_toolbar" in sys.modules}))
+"""
+
+
+def boot(profile, *options):
+    environ = {**os.environ, "DJANGO_SETTINGS_MODULE": f"StudyNotes.settings.{profile}"}
+    return subprocess.run([sys.executable, *options, "-c", BOOT], env=environ, cwd=settings.BASE_DIR,
+                          capture_output=True, text=True, check=True)
+
+
+def slowest_imports(stderr):
+    """(cumulative seconds, module) of the top level imports python -X importtime reports, slowest first"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented under the module that imported them
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:TOP_IMPORTS]
+
+
+class StartupBenchmarks(SimpleTestCase):
+
+    def test_startup_time(self):
+        boots = {profile: [] for profile in PROFILES}
+        # the profiles take turns so they all see the same machine and disk cache
+        for _ in range(RUNS):
+            for profile in PROFILES:
+                boots[profile].append(json.loads(boot(profile).stdout))
+        results = {}
+        for profile, runs in boots.items():
+            results[profile] = {
+                **{step: round(statistics.median(run[step] for run in runs) * 1000, 2)
+                   for step in ("settings", "setup", "handler")},
+                "modules": runs[0]["modules"],
+                "debug_toolbar": runs[0]["debug_toolbar"],
+                "slowest_imports": [(name, round(seconds * 1000, 2))
+                                    for seconds, name in slowest_imports(boot(profile, "-X", "importtime").stderr)],
+            }
+        self.assertFalse(results["prod"]["debug_toolbar"])
+
+        print(f"\nmedian of {RUNS} boots, ms")
+        for profile, result in results.items():
+            total = result["settings"] + result["setup"] + result["handler"]
+            print(f"  {profile:<6} settings={result['settings']:.1f}  setup={result['setup']:.1f}  "
+                  f"handler={result['handler']:.1f}  total={total:.1f}  modules={result['modules']}")
+            print("         " + ", ".join(f"{name} {ms:.0f}" for name, ms in result["slowest_imports"][:5]))
+        if OUTPUT:
+            Path(OUTPUT).write_text(json.dumps(results, indent=2) + "\n")
@@ -0,0 +1,61 @@
+"""
+Render time of the public feed with 100 notes, with the templates compiled once per worker by the cached loader
+against reading and parsing them on every render.
+
+    DATABASE_URL=sqlite:///bench.sqlite3 python manage.py test benchmarks --pattern="bench_templates.py"
+
+The feed's context comes from a request with a warm notes cache, then view_notes.html is looked up and rendered
+with it BENCH_RENDERS times by two engines set up like TEMPLATES with and without TEMPLATES_CACHED, taking turns
+so both see the same machine. Nothing is asserted about the times, they depend on the machine.
+"""
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.test import TestCase
+from django.urls import reverse
+
+from StudyNotes.instrumentation import DjangoTemplates
+
+from .datasets import PASSWORD, seed_dataset
+
+RENDERS = int(os.environ.get("BENCH_RENDERS", 500))
+
+
+def make_backend(cached):
+    loaders = settings.TEMPLATE_LOADERS
+    config = settings.TEMPLATES[0]
+    options = {**config["OPTIONS"], "loaders": [("django.template.loaders.cached.Loader", loaders)] if cached
+               else loaders}
+    return DjangoTemplates({"NAME": "bench", "DIRS": config["DIRS"], "APP_DIRS": False, "OPTIONS": options})
+
+
+class TemplateLoaderBenchmarks(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # 5 users with 40 notes each, every other one public
+        cls.users, _ = seed_dataset(users=5, notes_per_user=40, tags_per_note=3, likes_per_note=2)
+
+    def test_feed_render_time(self):
+        self.client.login(email=self.users[0].email, password=PASSWORD)
+        response = self.client.get(reverse("public_notes") + "?page_size=100")
+        context = {name: response.context[name] for name in ("notes", "page", "liked_ids")}
+        self.assertEqual(len(context["notes"]), 100)
+
+        backends = {"cached loader": make_backend(True), "uncached loaders": make_backend(False)}
+        timings = {name: [] for name in backends}
+        for _ in range(RENDERS):
+            for name, backend in backends.items():
+                start = time.perf_counter()
+                backend.get_template("view_notes.html").render(context, response.wsgi_request)
+                timings[name].append(time.perf_counter() - start)
+
+        print(f"\npublic feed with 100 notes, {RENDERS} renders")
+        for name, values in timings.items():
+            values.sort()
+            print(f"  {name:<17} p50={statistics.median(values) * 1000:.2f}ms  "
+                  f"p95={values[int(len(values) * 0.95)] * 1000:.2f}ms")
+        cached, uncached = (statistics.median(values) for values in timings.values())
+        print(f"  saved per render: {(uncached - cached) * 1000:.2f}ms")
@@ -0,0 +1,150 @@
+"""
+Query count and latency benchmarks for every view of the notes and accounts apps.
+
+    DATABASE_URL=sqlite:///bench.sqlite3 python manage.py test benchmarks --pattern="bench_*.py"
+
+Every view is requested with an empty notes cache and once more with a warm one, for each dataset in
+benchmarks.datasets.DATASETS. Query counts above the ones in baseline.json fail the run, and so do scenarios missing
+from it, wall times are only compared with BENCH_CHECK_TIME=1 since they depend on the machine.
+BENCH_UPDATE_BASELINE=1 rewrites baseline.json with the measured numbers.
+"""
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from StudyNotes.instrumentation import collect
+from accounts import urls as accounts_urls
+from accounts.tokens import account_activation_token
+from notes import urls as notes_urls
+
+from .datasets import DATASETS, seed_dataset
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+TIME_TOLERANCE = float(os.environ.get("BENCH_TIME_TOLERANCE", 3))
+
+
+def summarize(metrics):
+    return {
+        "queries": metrics.queries,
+        "db_ms": round(metrics.db_time * 1000, 2),
+        "render_ms": round(metrics.render_time * 1000, 2),
+        "wall_ms": round(metrics.wall_time * 1000, 2),
+    }
+
+
+def scenarios(user, own_note, public_note):
+    """(name, method, url, data, logged in) for every URL name of notes/urls.py and accounts/urls.py"""
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = account_activation_token.make_token(user)
+    note_form = {"title": "bench", "description": "<p>bench</p>", "link": "", "form-TOTAL_FORMS": "2",
+                 "form-INITIAL_FORMS": "0", "form-0-tag": "tag 0", "form-1-tag": "bench"}
+    import_file = SimpleUploadedFile("notes.jsonl", "".join(
+        json.dumps({"title": f"bench {i}", "description": "<p>bench</p>", "tags": ["tag 0", f"bench {i}"]}) + "\n"
+        for i in range(20)).encode())
+    return [
+        ("home", "get", reverse("home"), None, False),
+        ("create_note", "get", reverse("create_note"), None, True),
+        ("create_note", "post", reverse("create_note"), note_form, True),
+        ("delete_note", "get", reverse("delete_note", args=[own_note.pk]), None, True),
+        ("update_note", "get", reverse("update_note", args=[own_note.pk]), None, True),
+        ("update_note", "post", reverse("update_note", args=[own_note.pk]), note_form, True),
+        ("view_notes", "get", reverse("view_notes"), None, True),
+        ("personal_detail_view", "get", reverse("personal_detail_view", args=[own_note.pk]), None, True),
+        ("public_notes", "get", reverse("public_notes"), None, False),
+        ("public_notes", "get", reverse("public_notes"), None, True),
+        ("public_detail_view", "get", reverse("public_detail_view", args=[public_note.pk]), None, False),
+        ("public_detail_view", "get", reverse("public_detail_view", args=[public_note.pk]), None, True),
+        ("profile", "get", reverse("profile"), None, True),
+        ("export_notes", "get", reverse("export_notes") + "?format=jsonl", None, True),
+        ("import_notes", "post", reverse("import_notes"), {"file": import_file}, True),
+        ("like_note", "post", reverse("like_note"), {"note_id": public_note.pk}, True),
+        ("search", "get", reverse("search") + "?q=lorem", None, False),
+        ("search_api", "get", reverse("search_api") + "?q=lorem", None, False),
+        ("tag_cloud", "get", reverse("tag_cloud"), None, False),
+        ("tag_notes", "get", reverse("tag_notes", args=["tag 0"]), None, False),
+        ("tag_autocomplete", "get", reverse("tag_autocomplete") + "?q=tag", None, False),
+        ("register", "get", reverse("register"), None, False),
+        ("login", "get", reverse("login"), None, False),
+        ("logout", "get", reverse("logout"), None, True),
+        ("activate", "get", reverse("activate", args=[uid, token]), None, False),
+        ("password_change", "get", reverse("password_change"), None, True),
+        ("password_reset", "get", reverse("password_reset"), None, False),
+        ("password_reset_confirm", "get", reverse("password_reset_confirm", args=[uid, token]), None, False),
+        ("profile_img_update", "get", reverse("profile_img_update"), None, True),
+        ("profile_name_update", "get", reverse("profile_name_update"), None, True),
+        ("profile_name_update", "post", reverse("profile_name_update"), {"name": "bench"}, True),
+    ]
+
+
+class ViewBenchmarks(TestCase):
+
+    def test_views(self):
+        baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        results = {dataset: self.run_dataset(**params) for dataset, params in DATASETS.items()}
+
+        for dataset, views in results.items():
+            print(f"\n{dataset}")
+            for key, metrics in views.items():
+                print(f"  {key:<55} " + "  ".join(f"{name}={value}" for name, value in metrics.items()))
+
+        if os.environ.get("BENCH_UPDATE_BASELINE"):
+            BASELINE_PATH.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            return
+        for dataset, views in results.items():
+            for key, metrics in views.items():
+                with self.subTest(dataset=dataset, view=key):
+                    expected = baseline.get(dataset, {}).get(key)
+                    # a new scenario has to come with its numbers, rerun with BENCH_UPDATE_BASELINE=1
+                    self.assertIsNotNone(expected, "missing from baseline.json")
+                    self.assertLessEqual(metrics["queries"], expected["queries"], "query count regression")
+                    if os.environ.get("BENCH_CHECK_TIME"):
+                        self.assertLessEqual(metrics["wall_ms"], expected["wall_ms"] * TIME_TOLERANCE,
+                                             "wall time regression")
+
+    def test_every_url_has_a_scenario(self):
+        users, notes = seed_dataset(users=2, notes_per_user=2, tags_per_note=1, likes_per_note=1)
+        names = {pattern.name for pattern in notes_urls.urlpatterns + accounts_urls.urlpatterns}
+        covered = {scenario[0] for scenario in scenarios(users[0], notes[0], notes[2])}
+        self.assertEqual(names - covered, set())
+
+    def run_dataset(self, **params):
+        with transaction.atomic():
+            results = self.measure_views(*seed_dataset(**params))
+            transaction.set_rollback(True)
+        return results
+
+    def measure_views(self, users, notes):
+        user = users[0]
+        own_note = next(note for note in notes if note.user_id == user.pk)
+        public_note = next(note for note in notes if note.is_public and note.user_id != user.pk)
+        results = {}
+        for name, method, url, data, logged_in in scenarios(user, own_note, public_note):
+            key = f"{method.upper()} {name}{' (user)' if logged_in else ''}"
+            for cache_state in ("cold", "warm"):
+                if cache_state == "cold":
+                    caches[settings.NOTES_CACHE_ALIAS].clear()
+                if logged_in:
+                    self.client.force_login(user)
+                else:
+                    self.client.logout()
+                for value in (data or {}).values():
+                    # uploads are read by every request
+                    if hasattr(value, "seek"):
+                        value.seek(0)
+                with collect() as metrics:
+                    response = getattr(self.client, method)(url, data)
+                    if response.streaming:
+                        # a streamed body runs its queries while it is read, after the view has returned
+                        b"".join(map(force_bytes, response.streaming_content))
+                self.assertLess(response.status_code, 400, f"{key} returned {response.status_code}")
+                results[f"{key} [{cache_state}]"] = summarize(metrics)
+        return results
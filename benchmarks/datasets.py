@@ -0,0 +1,51 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from notes.models import Notes, NotesTags, Tags, UserLikes
+from notes.search import update_search_index
+from notes.stats import recompute_profile_stats
+from notes.tagging import reconcile_public_note_counts
+from notes.utils import make_excerpt
+
+DATASETS = {
+    "small": {"users": 5, "notes_per_user": 10, "tags_per_note": 3, "likes_per_note": 2},
+    "medium": {"users": 20, "notes_per_user": 50, "tags_per_note": 5, "likes_per_note": 10},
+}
+
+PASSWORD = "bench-password"
+
+
+def seed_dataset(users, notes_per_user, tags_per_note, likes_per_note, seed=0):
+    """Deterministic dataset with every derived column (counters, excerpts, search index) filled in"""
+    rng = random.Random(seed)
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create([User(email=f"user{i}@bench.local", name=f"user {i}", password=password)
+                                      for i in range(users)])
+    tags = Tags.objects.bulk_create([Tags(tag=f"tag {i}") for i in range(tags_per_note * 4)])
+    notes = []
+    for user in users:
+        for i in range(notes_per_user):
+            words = ["lorem", "ipsum", "dolor", "sit"]
+            description = "".join(f"<p>{' '.join(rng.choice(words) for _ in range(40))}</p>" for _ in range(3))
+            notes.append(Notes(user=user, title=f"{user.name} note {i}", description=description,
+                               excerpt=make_excerpt(description), link="https://example.com",
+                               is_public=i % 2 == 0))
+    Notes.objects.bulk_create(notes)
+
+    notes_tags, likes = [], []
+    for note in notes:
+        notes_tags += [NotesTags(notes_id=note, tags_id=tag) for tag in rng.sample(tags, tags_per_note)]
+        fans = rng.sample([user for user in users if user.pk != note.user_id], min(likes_per_note, len(users) - 1))
+        likes += [UserLikes(notes=note, users=fan, value="Like") for fan in fans]
+        note.like_count = len(fans)
+    NotesTags.objects.bulk_create(notes_tags)
+    UserLikes.objects.bulk_create(likes)
+    Notes.objects.bulk_update(notes, ["like_count"])
+
+    reconcile_public_note_counts()
+    recompute_profile_stats([user.pk for user in users])
+    update_search_index([note.pk for note in notes])
+    return users, notes
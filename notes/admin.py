@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .forms import NotesForm, TagsForm
-from .models import Tags, Notes, NotesTags
+from .models import Tags, Notes
 from accounts.models import CustomUser
 from accounts.froms import CustomUserCreationForm, CustomUserChangeForm
 
@@ -44,4 +44,3 @@ class TagsAdmin(admin.ModelAdmin):
 admin.site.register(CustomUser)
 admin.site.register(Tags)
 admin.site.register(Notes)
-admin.site.register(NotesTags)
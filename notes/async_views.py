@@ -0,0 +1,92 @@
+"""
+Async versions of the read-heavy views, routed instead of the ones in notes.views with NOTES_ASYNC_VIEWS
+when the project is served over ASGI.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.shortcuts import redirect, render
+
+from .caching import aget_note_cards, aget_note_detail, aget_public_feed_page
+from .conditional import conditional, note_keys, public_feed_keys
+from .models import Notes, UserLikes
+from .pagination import get_cursor, get_page_size
+from .views import get_search_queryset, search_response
+from StudyNotes.routers import read_from_replica
+
+
+async def aget_user(request):
+    # AuthenticationMiddleware loads request.user lazily with sync queries and Django 4.1 has no request.auser(),
+    # load it once in a thread, the session is loaded along with it
+    await sync_to_async(bool)(request.user)
+    return request.user
+
+
+async def aget_liked_note_ids(user, note_ids):
+    if not user.is_authenticated or not note_ids:
+        return set()
+    return {pk async for pk in UserLikes.objects.filter(users=user, notes__in=note_ids)
+            .values_list("notes_id", flat=True)}
+
+
+@read_from_replica
+@conditional(public_feed_keys)
+async def view_all_public_notes(request):
+    user = await aget_user(request)
+    page = await aget_public_feed_page(*get_cursor(request), get_page_size(request))
+    notes = await aget_note_cards(page.object_list)
+    return render(request, "view_notes.html", {"notes": notes, "page": page,
+                                               "liked_ids": await aget_liked_note_ids(user, page.object_list)})
+
+
+@read_from_replica
+@conditional(note_keys)
+async def public_note_detail_view(request, pk):
+    user = await aget_user(request)
+    note = await aget_note_detail(pk)
+    if note is None or not note["is_public"]:
+        raise Http404("No Notes matches the given query.")
+    return render(request, "note_detail_view.html", {"note": note,
+                                                     "liked": bool(await aget_liked_note_ids(user, [pk]))})
+
+
+async def aget_search_page(request):
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return query, None
+    paginator = Paginator(get_search_queryset(await aget_user(request), query), get_page_size(request))
+    # Paginator would count with a sync query, its count is a cached_property that can be filled in beforehand
+    paginator.count = await paginator.object_list.acount()
+    page = paginator.get_page(request.GET.get("page"))
+    page.object_list = [note async for note in page.object_list]
+    return query, page
+
+
+@read_from_replica
+async def search_view(request):
+    query, page = await aget_search_page(request)
+    return render(request, "search_results.html", {"query": query, "page": page})
+
+
+@read_from_replica
+async def search_api(request):
+    return search_response(*await aget_search_page(request))
+
+
+async def like_view(request):
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if request.method == "POST":
+        try:
+            note_obj = await Notes.objects.only("id").aget(id=request.POST.get("note_id"))
+        except Notes.DoesNotExist:
+            raise Http404("No Notes matches the given query.")
+        # the toggle runs in a transaction, which the async ORM of Django 4.1 can't open
+        await sync_to_async(note_obj.toggle_like)(user.id)
+
+        if request.POST.get("page") == "detail":
+            return redirect("public_detail_view", note_obj.id)
+
+    return redirect("public_notes")
@@ -0,0 +1,97 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .models import Tags
+
+
+class TagIndex:
+    """
+    Sorted in-process copy of Tags.tag answering prefix lookups with a bisection.
+    Writers replace the list instead of mutating it, so lookups never need the lock.
+    """
+
+    def __init__(self):
+        self.tags = []
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    @property
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > settings.NOTES_TAG_INDEX_TTL
+
+    def warm(self):
+        tags = sorted(Tags.objects.values_list("tag", flat=True).iterator(chunk_size=10000))
+        with self.lock:
+            self.tags = tags
+            self.loaded_at = time.monotonic()
+
+    def refresh_if_stale(self):
+        """
+        Reload the index once NOTES_TAG_INDEX_TTL is over. A single caller reloads it while the others go on with the
+        current list, only the first load is waited for.
+        """
+        if not self.is_stale:
+            return
+        if not self.refresh_lock.acquire(blocking=self.loaded_at is None):
+            return
+        try:
+            if self.is_stale:
+                self.warm()
+        finally:
+            self.refresh_lock.release()
+
+    def add(self, names):
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            tags = self.tags
+            for name in names:
+                i = bisect_left(tags, name)
+                if i == len(tags) or tags[i] != name:
+                    tags = tags[:i] + [name] + tags[i:]
+            self.tags = tags
+
+    def discard(self, names):
+        if self.loaded_at is None:
+            return
+        names = set(names)
+        with self.lock:
+            self.tags = [tag for tag in self.tags if tag not in names]
+
+    def complete(self, prefix, limit):
+        tags = self.tags
+        start = bisect_left(tags, prefix)
+        result = []
+        for tag in tags[start:start + limit]:
+            if not tag.startswith(prefix):
+                break
+            result.append(tag)
+        return result
+
+
+tag_index = TagIndex()
+
+
+def warm_tag_index():
+    """Called once the WSGI/ASGI application is loaded, a missing table must not prevent the worker from booting"""
+    if settings.NOTES_TAG_INDEX_ENABLED:
+        try:
+            tag_index.warm()
+        except DatabaseError:
+            pass
+
+
+def autocomplete_tags(prefix, limit):
+    """Existing tags starting with the normalized prefix in alphabetical order"""
+    if not prefix:
+        return []
+    if settings.NOTES_TAG_INDEX_ENABLED:
+        tag_index.refresh_if_stale()
+        return tag_index.complete(prefix, limit)
+    # LIKE 'prefix%' is served by the varchar_pattern_ops index PostgreSQL gets for the unique tag column
+    return list(Tags.objects.filter(tag__startswith=prefix).order_by("tag").values_list("tag", flat=True)[:limit])
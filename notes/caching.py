@@ -0,0 +1,193 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+from StudyNotes.routers import primary_reads
+
+from .models import Notes
+from .pagination import CursorPage, apaginate_notes, decode_cursor, paginate_notes
+
+FEED_VERSION_KEY = "notes:feed:version"
+
+
+def get_cache():
+    return caches[settings.NOTES_CACHE_ALIAS]
+
+
+def note_version_key(pk):
+    return f"notes:version:{pk}"
+
+
+def new_version():
+    # versions start from the clock, so a counter evicted from the cache never comes back
+    # with a value that old fragments are still keyed with
+    return time.time_ns() // 1000
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            versions[key] = version if cache.add(key, version, None) else cache.get(key, version)
+    return versions
+
+
+async def aget_versions(keys):
+    cache = get_cache()
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            versions[key] = version if await cache.aadd(key, version, None) else await cache.aget(key, version)
+    return versions
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), None)
+
+
+def bump_note_version(pk):
+    bump_version(note_version_key(pk))
+
+
+def bump_feed_version():
+    bump_version(FEED_VERSION_KEY)
+
+
+def note_entry(note, html):
+    """The part of a note needed around its shared fragment to render per-user bits"""
+    return {
+        "id": note.pk,
+        "user_id": note.user_id,
+        "is_public": note.is_public,
+        "like_count": note.like_count,
+        "title": note.title,
+        "html": html,
+    }
+
+
+def card_keys(note_ids, versions):
+    return {pk: f"notes:card:{pk}:{versions[note_version_key(pk)]}" for pk in note_ids}
+
+
+def card_queryset(note_ids):
+    return Notes.objects.filter(pk__in=note_ids).select_related("user").prefetch_related("tags_set")\
+        .defer("description", "search_document", "search_vector")
+
+
+def card_entry(note):
+    return note_entry(note, render_to_string("inc/_note_card.html", {"note": note}))
+
+
+def get_note_cards(note_ids):
+    """Feed cards of the given notes in the given order, only notes changed since they were cached are rendered"""
+    cache = get_cache()
+    keys = card_keys(note_ids, get_versions([note_version_key(pk) for pk in note_ids]))
+    found = cache.get_many(keys.values())
+    entries = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in note_ids if pk not in entries]
+    if missing:
+        # cache misses read the primary, a lagging replica would store stale rows under the new version
+        with primary_reads():
+            rendered = {note.pk: card_entry(note) for note in card_queryset(missing)}
+        cache.set_many({keys[pk]: entry for pk, entry in rendered.items()})
+        entries.update(rendered)
+    return [entries[pk] for pk in note_ids if pk in entries]
+
+
+async def aget_note_cards(note_ids):
+    cache = get_cache()
+    keys = card_keys(note_ids, await aget_versions([note_version_key(pk) for pk in note_ids]))
+    found = await cache.aget_many(keys.values())
+    entries = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in note_ids if pk not in entries]
+    if missing:
+        with primary_reads():
+            rendered = {note.pk: card_entry(note) async for note in card_queryset(missing)}
+        await cache.aset_many({keys[pk]: entry for pk, entry in rendered.items()})
+        entries.update(rendered)
+    return [entries[pk] for pk in note_ids if pk in entries]
+
+
+def detail_queryset(pk):
+    return Notes.objects.select_related("user").prefetch_related("tags_set")\
+        .defer("search_document", "search_vector").filter(pk=pk)
+
+
+def detail_entry(note):
+    return note_entry(note, render_to_string("inc/_note_detail.html", {"note": note}))
+
+
+def get_note_detail(pk):
+    cache = get_cache()
+    version = get_versions([note_version_key(pk)])[note_version_key(pk)]
+    key = f"notes:detail:{pk}:{version}"
+    entry = cache.get(key)
+    if entry is None:
+        with primary_reads():
+            note = detail_queryset(pk).first()
+        if note is None:
+            return None
+        entry = detail_entry(note)
+        cache.set(key, entry)
+    return entry
+
+
+async def aget_note_detail(pk):
+    cache = get_cache()
+    version = (await aget_versions([note_version_key(pk)]))[note_version_key(pk)]
+    key = f"notes:detail:{pk}:{version}"
+    entry = await cache.aget(key)
+    if entry is None:
+        with primary_reads():
+            note = await detail_queryset(pk).afirst()
+        if note is None:
+            return None
+        entry = detail_entry(note)
+        await cache.aset(key, entry)
+    return entry
+
+
+def feed_key(version, cursor, direction, page_size):
+    if cursor:
+        decode_cursor(cursor)
+    return f"notes:feed:{version}:{direction}:{cursor or ''}:{page_size}"
+
+
+def feed_queryset():
+    return Notes.objects.filter(is_public=True).only("id", "created_at")
+
+
+def get_public_feed_page(cursor, direction, page_size):
+    """Ids and cursors of a public feed page, they only change when a note joins or leaves the feed"""
+    cache = get_cache()
+    key = feed_key(get_versions([FEED_VERSION_KEY])[FEED_VERSION_KEY], cursor, direction, page_size)
+    cached = cache.get(key)
+    if cached is None:
+        with primary_reads():
+            page = paginate_notes(feed_queryset(), cursor, direction, page_size)
+        cached = ([note.pk for note in page], page.next_cursor, page.previous_cursor)
+        cache.set(key, cached)
+    ids, next_cursor, previous_cursor = cached
+    return CursorPage(ids, page_size, next_cursor, previous_cursor)
+
+
+async def aget_public_feed_page(cursor, direction, page_size):
+    cache = get_cache()
+    key = feed_key((await aget_versions([FEED_VERSION_KEY]))[FEED_VERSION_KEY], cursor, direction, page_size)
+    cached = await cache.aget(key)
+    if cached is None:
+        with primary_reads():
+            page = await apaginate_notes(feed_queryset(), cursor, direction, page_size)
+        cached = ([note.pk for note in page], page.next_cursor, page.previous_cursor)
+        await cache.aset(key, cached)
+    ids, next_cursor, previous_cursor = cached
+    return CursorPage(ids, page_size, next_cursor, previous_cursor)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_notes_cache_is_shared(app_configs, **kwargs):
+    # the note versions live in this cache, the ETags and fragment keys of every worker are derived from them
+    if settings.CACHES[settings.NOTES_CACHE_ALIAS]["BACKEND"] in PROCESS_LOCAL_CACHES:
+        return [checks.Warning(
+            "The notes cache is local to each process, a note changed through one worker stays cached and "
+            "revalidated as unchanged by the others.",
+            hint="Point NOTES_CACHE_BACKEND and NOTES_CACHE_LOCATION at Redis or Memcached.",
+            id="notes.W001",
+        )]
+    return []
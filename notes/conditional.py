@@ -0,0 +1,122 @@
+"""
+Conditional GET for note pages and feeds.
+
+The ETag of a page is derived from the cache versions of the notes it shows, which are bumped whenever a note is
+saved (updated_at), its tags change or it is liked, plus the viewer, whose name and picture are in the nav, and the
+viewer's CSRF secret the forms' csrfmiddlewaretoken is made from. Those are the versions the rendered fragments are
+keyed with, so a matching If-None-Match gets a 304 from one cache lookup, before the view runs and without rendering
+anything.
+
+No Last-Modified is sent: updated_at doesn't move on likes or for another viewer, and a client revalidating with
+If-Modified-Since alone would be told a stale page is still fresh.
+"""
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .caching import FEED_VERSION_KEY, get_public_feed_page, get_versions, note_version_key
+from .models import Notes, Tags
+from .pagination import get_cursor, get_page_size, paginate_request
+
+
+def viewer_key(user):
+    if not user.is_authenticated:
+        return "anonymous"
+    return f"{user.pk}:{user.name}:{user.profile_img.name}:{user.profile_thumbnails.get('source')}"
+
+
+def page_digest(user, keys):
+    versions = get_versions(keys)
+    return "|".join([settings.NOTES_ETAG_SALT, viewer_key(user)] + [f"{key}={versions[key]}" for key in keys])
+
+
+def make_etag(request, digest):
+    # a client whose secret changed, e.g. after clearing its cookies, must not keep a page with a token made from the
+    # old one. The view may create the secret while rendering, so this is called again once it has run
+    parts = [digest, request.META.get("CSRF_COOKIE", "")]
+    return quote_etag(hashlib.md5("|".join(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def has_messages(request):
+    # a page showing flash messages must not be revalidated later, they would come back with it
+    return bool(len(get_messages(request)))
+
+
+def set_etag(request, response, digest):
+    if digest is None or response.status_code not in (200, 304):
+        return response
+    response.headers.setdefault("ETag", make_etag(request, digest))
+    # browsers and shared caches have to ask every time, the 304 is what makes asking cheap
+    patch_cache_control(response, no_cache=True, private=request.user.is_authenticated)
+    return response
+
+
+def conditional(get_version_keys):
+    """
+    Answer conditional GETs of the decorated view from the cache version keys get_version_keys(request, *args,
+    **kwargs) returns in page order, None lets the view handle the request as usual, e.g. to 404.
+    """
+    def get_digest(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or has_messages(request):
+            return None
+        keys = get_version_keys(request, *args, **kwargs)
+        return None if keys is None else page_digest(request.user, keys)
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                digest = await sync_to_async(get_digest)(request, *args, **kwargs)
+                response = digest and get_conditional_response(request, etag=make_etag(request, digest))
+                return set_etag(request, response or await view(request, *args, **kwargs), digest)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                digest = get_digest(request, *args, **kwargs)
+                response = digest and get_conditional_response(request, etag=make_etag(request, digest))
+                return set_etag(request, response or view(request, *args, **kwargs), digest)
+        return wrapper
+    return decorator
+
+
+def note_keys(request, pk):
+    return [note_version_key(pk)]
+
+
+def public_feed_keys(request):
+    page = get_public_feed_page(*get_cursor(request), get_page_size(request))
+    return [FEED_VERSION_KEY] + [note_version_key(pk) for pk in page.object_list]
+
+
+def personal_feed_page(request):
+    # computed once per request, for the ETag and then for the view when it has to render
+    if not hasattr(request, "personal_feed_page"):
+        request.personal_feed_page = paginate_request(Notes.objects.filter(user=request.user)
+                                                      .only("id", "created_at"), request)
+    return request.personal_feed_page
+
+
+def tag_feed_page(request, tag):
+    """(tag, page of its public notes), None for an unknown tag"""
+    if not hasattr(request, "tag_feed_page"):
+        tag_obj = Tags.objects.filter(tag=tag).first()
+        request.tag_feed_page = tag_obj and (tag_obj, paginate_request(
+            Notes.objects.filter(is_public=True, tags=tag_obj).only("id", "created_at"), request))
+    return request.tag_feed_page
+
+
+def personal_feed_keys(request):
+    return [note_version_key(note.pk) for note in personal_feed_page(request)]
+
+
+def tag_feed_keys(request, tag):
+    found = tag_feed_page(request, tag)
+    if found is None:
+        return None
+    return [note_version_key(note.pk) for note in found[1]]
@@ -0,0 +1,127 @@
+"""
+Streaming exports of notes as JSONL, CSV or a ZIP with one Markdown file per note.
+
+Notes are read with a server-side cursor on PostgreSQL, NOTES_EXPORT_CHUNK_SIZE at a time with the tags of each chunk
+prefetched, and every writer yields its output as it goes, so memory stays flat however many notes are exported.
+Under ASGI the view asks for a buffered export instead, Django 4.1 iterates streaming responses on the event loop.
+"""
+import csv
+import json
+import zipfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils.text import slugify
+
+from .models import Notes, Tags
+
+FORMATS = {
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "csv": ("text/csv", "csv"),
+    "md": ("application/zip", "zip"),
+}
+FIELDS = ["id", "title", "description", "link", "is_public", "like_count", "tags", "created_at", "updated_at"]
+
+
+def export_queryset(user=None):
+    """Notes of the user, or of everyone without one"""
+    notes = Notes.objects.order_by("pk").only(*(field for field in FIELDS if field != "tags"), "user__email")\
+        .select_related("user").prefetch_related(Prefetch("tags_set", queryset=Tags.objects.only("id", "tag")))
+    return notes if user is None else notes.filter(user=user)
+
+
+def iter_rows(notes, chunk_size=None):
+    for note in notes.iterator(chunk_size=chunk_size or settings.NOTES_EXPORT_CHUNK_SIZE):
+        yield {
+            "id": note.pk,
+            "user": note.user.email,
+            "title": note.title,
+            "description": note.description,
+            "link": note.link,
+            "is_public": note.is_public,
+            "like_count": note.like_count,
+            "tags": sorted(tag.tag for tag in note.tags_set.all()),
+            "created_at": note.created_at,
+            "updated_at": note.updated_at,
+        }
+
+
+def write_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class Echo:
+    """File-like object handing back what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def write_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(["user"] + FIELDS)
+    for row in rows:
+        yield writer.writerow([row["user"]] + [",".join(row["tags"]) if field == "tags" else row[field]
+                                               for field in FIELDS])
+
+
+def render_markdown(row):
+    # Markdown allows raw HTML, the TinyMCE body is kept as it is instead of being converted
+    front_matter = [
+        ("title", json.dumps(row["title"])),
+        ("tags", json.dumps(row["tags"])),
+        ("link", row["link"]),
+        ("public", str(row["is_public"]).lower()),
+        ("created_at", row["created_at"].isoformat()),
+        ("updated_at", row["updated_at"].isoformat()),
+    ]
+    return "---\n" + "".join(f"{key}: {value}\n" for key, value in front_matter) + "---\n\n"\
+        + f"# {row['title']}\n\n{row['description']}\n"
+
+
+class ZipStream:
+    """Write-only file zipfile streams into, without seek() it writes sizes after each file's data"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_markdown_zip(rows):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+        for row in rows:
+            name = f"{row['id']}-{slugify(row['title'])[:60] or 'note'}.md"
+            info = zipfile.ZipInfo(name, date_time=row["updated_at"].timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, render_markdown(row))
+            yield stream.drain()
+    # the central directory is written on close
+    yield stream.drain()
+
+
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv, "md": write_markdown_zip}
+
+
+def export_notes(fmt, user=None, chunk_size=None, buffered=False):
+    """Chunks of the export, str for jsonl and csv, bytes for md. Buffered exports read every note upfront."""
+    rows = iter_rows(export_queryset(user), chunk_size)
+    return WRITERS[fmt](list(rows) if buffered else rows)
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Notes, Tags
+from .tagging import normalize_tag
 from django.core.exceptions import ValidationError
 
 
@@ -15,7 +16,8 @@ class NotesForm(forms.ModelForm):
 
 
 class TagsForm(forms.Form):
-    tag = forms.CharField(max_length=30, label="", required=False)
+    tag = forms.CharField(max_length=30, label="", required=False,
+                          widget=forms.TextInput(attrs={"list": "tag-suggestions", "autocomplete": "off"}))
 
     class Meta:
         model = Tags
@@ -27,5 +29,5 @@ class TagsForm(forms.Form):
             return None
         if len(tag) > 30:
             raise ValidationError("one tag should be maximum 30 characters long")
-        return " ".join(tag.split()).lower()
+        return normalize_tag(tag)
 
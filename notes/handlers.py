@@ -0,0 +1,138 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import F, Subquery
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .autocomplete import tag_index
+from .caching import bump_feed_version, bump_note_version
+from .models import Notes, NotesTags, ProfileStats, Tags, UserLikes
+from .search import update_search_index
+from .signals import like_toggled, tags_changed
+from .stats import adjust_profile_stats, refresh_distinct_tags
+from .tagging import adjust_public_note_counts
+
+
+@receiver(post_save, sender=Notes)
+def refresh_search_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"title", "description"} & set(update_fields):
+        update_search_index([instance.pk])
+
+
+@receiver(tags_changed, sender=Notes)
+def refresh_note_on_tags_change(sender, note, **kwargs):
+    update_search_index([note.pk])
+    bump_note_version(note.pk)
+
+
+@receiver(post_save, sender=Notes)
+def invalidate_cache_on_save(sender, instance, **kwargs):
+    bump_note_version(instance.pk)
+    # new notes are not in the public feed yet
+    if getattr(instance, "loaded_is_public", False) != instance.is_public:
+        bump_feed_version()
+
+
+@receiver(post_delete, sender=Notes)
+def invalidate_cache_on_delete(sender, instance, **kwargs):
+    bump_note_version(instance.pk)
+    if instance.is_public:
+        bump_feed_version()
+
+
+@receiver(like_toggled, sender=Notes)
+def invalidate_cache_on_like(sender, note_id, **kwargs):
+    bump_note_version(note_id)
+
+
+@receiver(tags_changed, sender=Notes)
+def count_public_tags_on_tags_change(sender, note, added, removed, **kwargs):
+    if note.is_public:
+        adjust_public_note_counts(added, 1)
+        adjust_public_note_counts(removed, -1)
+
+
+@receiver(post_save, sender=Notes)
+def count_public_tags_on_save(sender, instance, created, **kwargs):
+    was_public = getattr(instance, "loaded_is_public", None)
+    if not created and was_public is not None and was_public != instance.is_public:
+        tag_ids = list(NotesTags.objects.filter(notes_id=instance).values_list("tags_id", flat=True))
+        adjust_public_note_counts(tag_ids, 1 if instance.is_public else -1)
+
+
+@receiver(pre_delete, sender=Notes)
+def count_public_tags_on_delete(sender, instance, **kwargs):
+    if instance.is_public:
+        tag_ids = list(NotesTags.objects.filter(notes_id=instance).values_list("tags_id", flat=True))
+        adjust_public_note_counts(tag_ids, -1)
+
+
+@receiver(post_save, sender=Tags)
+def index_new_tag(sender, instance, created, **kwargs):
+    if created:
+        tag_index.add([instance.tag])
+
+
+@receiver(pre_delete, sender=Tags)
+def collect_notes_of_deleted_tag(sender, instance, **kwargs):
+    # the cascade removes the NotesTags rows without going through set_note_tags
+    instance.tagged_notes = list(Notes.objects.filter(notestags__tags_id=instance))
+
+
+@receiver(post_delete, sender=Tags)
+def untag_notes_of_deleted_tag(sender, instance, **kwargs):
+    tag_index.discard([instance.tag])
+    for note in getattr(instance, "tagged_notes", []):
+        tags_changed.send(sender=Notes, note=note, added=set(), removed={instance.pk})
+
+
+@receiver(post_save, sender=Notes)
+def count_profile_stats_on_save(sender, instance, created, **kwargs):
+    stats = ProfileStats.objects.filter(user_id=instance.user_id)
+    was_public = getattr(instance, "loaded_is_public", None)
+    if created:
+        adjust_profile_stats(stats, note_count=1, public_note_count=int(instance.is_public))
+    elif was_public is not None and was_public != instance.is_public:
+        adjust_profile_stats(stats, public_note_count=1 if instance.is_public else -1)
+
+
+@receiver(pre_delete, sender=Notes)
+def count_profile_stats_on_delete(sender, instance, **kwargs):
+    adjust_profile_stats(ProfileStats.objects.filter(user_id=instance.user_id),
+                         note_count=-1, public_note_count=-int(instance.is_public),
+                         total_tags=-NotesTags.objects.filter(notes_id=instance).count(),
+                         likes_received=-instance.like_count)
+
+
+@receiver(post_delete, sender=Notes)
+def refresh_distinct_tags_on_delete(sender, instance, **kwargs):
+    refresh_distinct_tags(instance.user_id)
+
+
+@receiver(tags_changed, sender=Notes)
+def count_profile_stats_on_tags_change(sender, note, added, removed, **kwargs):
+    adjust_profile_stats(ProfileStats.objects.filter(user_id=note.user_id), total_tags=len(added) - len(removed))
+    refresh_distinct_tags(note.user_id)
+
+
+@receiver(like_toggled, sender=Notes)
+def count_profile_stats_on_like(sender, note_id, liked, **kwargs):
+    owner = Notes.objects.filter(pk=note_id).values("user_id")
+    adjust_profile_stats(ProfileStats.objects.filter(user_id=Subquery(owner)), likes_received=1 if liked else -1)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def uncount_likes_of_deleted_user(sender, instance, **kwargs):
+    # the cascade removes the user's likes without going through remove_like, the counters of the notes they liked
+    # and of those notes' owners go down here; their own notes go away with them
+    note_ids = list(UserLikes.objects.filter(users=instance).exclude(notes__user=instance)
+                    .values_list("notes_id", flat=True))
+    if not note_ids:
+        return
+    Notes.objects.filter(pk__in=note_ids).update(like_count=F("like_count") - 1)
+    owners = Counter(Notes.objects.filter(pk__in=note_ids).values_list("user_id", flat=True))
+    for owner_id, count in owners.items():
+        adjust_profile_stats(ProfileStats.objects.filter(user_id=owner_id), likes_received=-count)
+    for note_id in note_ids:
+        bump_note_version(note_id)
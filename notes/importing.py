@@ -0,0 +1,245 @@
+"""
+Streaming imports of notes from JSONL, CSV or a ZIP of Markdown files, the formats notes.export writes.
+
+Rows are read one at a time and validated with NotesForm and TagsForm, then inserted NOTES_IMPORT_BATCH_SIZE at a time
+with bulk_create, one transaction per batch. Invalid rows are reported and skipped, and a batch the database rejects
+is retried row by row, so one bad row never aborts the import.
+
+Uploads over NOTES_IMPORT_MAX_SIZE bytes are refused before anything is read. A ZIP is refused when it has more than
+NOTES_IMPORT_MAX_ENTRIES entries, and its Markdown files are decompressed one at a time, at most
+NOTES_IMPORT_MAX_ENTRY_SIZE bytes each, so a small archive can't expand into the worker's memory.
+"""
+import csv
+import io
+import json
+import zipfile
+from collections import Counter, defaultdict
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .caching import bump_feed_version
+from .forms import NotesForm, TagsForm
+from .models import Notes, NotesTags
+from .search import update_search_index
+from .stats import recompute_profile_stats
+from .tagging import adjust_public_note_counts, resolve_tags
+from .utils import make_excerpt
+
+EXTENSIONS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".zip": "md"}
+NOTE_FIELDS = ("title", "description", "link", "is_public")
+# CheckboxInput would take any other non-empty string, "no" or "0" included, for True
+BOOLEANS = {"true": True, "1": True, "yes": True, "on": True, "false": False, "0": False, "no": False, "off": False,
+            "": False}
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFileError(Exception):
+    """The file as a whole can't be imported"""
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, where, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": where, "errors": errors})
+
+    def as_dict(self):
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+
+def guess_format(filename):
+    return EXTENSIONS.get(PurePosixPath(filename or "").suffix.lower())
+
+
+def read_jsonl(file):
+    for number, line in enumerate(io.TextIOWrapper(file, encoding="utf-8-sig"), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = ValueError(f"Invalid JSON: {exc}")
+        yield f"line {number}", row
+
+
+def read_csv(file):
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        yield f"line {reader.line_num}", row
+
+
+def parse_markdown(name, text):
+    """Front matter and body of a note written by notes.export.render_markdown, or of a plain Markdown file"""
+    row = {}
+    if text.startswith("---\n"):
+        front_matter, _, text = text[4:].partition("\n---\n")
+        for line in front_matter.splitlines():
+            key, _, value = line.partition(":")
+            value = value.strip()
+            if key in ("title", "tags") and value.startswith(("[", '"')):
+                value = json.loads(value)
+            row["is_public" if key == "public" else key] = value
+    body = text.lstrip("\n")
+    heading, _, rest = body.partition("\n")
+    if heading.startswith("# "):
+        row.setdefault("title", heading[2:].strip())
+        body = rest
+    row.setdefault("title", PurePosixPath(name).stem)
+    row["description"] = body.strip()
+    return row
+
+
+def read_entry(archive, info, limit):
+    # file_size comes from the archive, the read is bounded whatever it says
+    if info.file_size > limit:
+        return None
+    with archive.open(info) as entry:
+        data = entry.read(limit + 1)
+    return None if len(data) > limit else data
+
+
+def read_markdown_zip(file):
+    limit = settings.NOTES_IMPORT_MAX_ENTRY_SIZE
+    with zipfile.ZipFile(file) as archive:
+        infos = archive.infolist()
+        if len(infos) > settings.NOTES_IMPORT_MAX_ENTRIES:
+            raise ImportFileError(f"The archive has more than {settings.NOTES_IMPORT_MAX_ENTRIES} files")
+        for info in infos:
+            if info.is_dir() or not info.filename.endswith(".md"):
+                continue
+            data = read_entry(archive, info, limit)
+            if data is None:
+                yield info.filename, ValueError(f"The file is larger than {limit} bytes")
+                continue
+            try:
+                row = parse_markdown(info.filename, data.decode("utf-8-sig"))
+            except ValueError as exc:
+                row = ValueError(f"Invalid Markdown file: {exc}")
+            yield info.filename, row
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv, "md": read_markdown_zip}
+
+
+def parse_boolean(value):
+    """True or False for a JSON boolean or one of the BOOLEANS strings, None for anything else"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, str):
+        return BOOLEANS.get(value.strip().lower())
+    return None
+
+
+def clean_row(row):
+    """(note fields, tag names, errors) of a parsed row, validated like create_note_view does"""
+    if isinstance(row, ValueError):
+        return None, [], {"__all__": [str(row)]}
+    if not isinstance(row, dict):
+        return None, [], {"__all__": ["Expected an object"]}
+    data = {field: row.get(field) for field in NOTE_FIELDS if row.get(field) is not None}
+    errors = {}
+    is_public = parse_boolean(row.get("is_public"))
+    if is_public is None:
+        errors["is_public"] = ["Expected true or false"]
+    data["is_public"] = bool(is_public)
+    form = NotesForm(data=data)
+    if not form.is_valid():
+        errors.update((field, list(messages)) for field, messages in form.errors.items())
+    tags = row.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    elif not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        errors["tags"] = ["Expected a list of tag names or a comma separated string"]
+        tags = []
+    names = []
+    for tag in tags:
+        tag_form = TagsForm(data={"tag": tag})
+        if not tag_form.is_valid():
+            errors.setdefault("tags", []).extend(tag_form.errors["tag"])
+        elif tag_form.cleaned_data["tag"]:
+            names.append(tag_form.cleaned_data["tag"])
+    if errors:
+        return None, [], errors
+    return form.cleaned_data, list(dict.fromkeys(names)), {}
+
+
+def insert_batch(user, batch):
+    """Insert [(note fields, tag names)] in one transaction, returns the notes"""
+    with transaction.atomic():
+        tags = {tag.tag: tag for tag in resolve_tags(list({name for _, names in batch for name in names}))}
+        notes = Notes.objects.bulk_create([
+            Notes(user=user, excerpt=make_excerpt(fields["description"]), **fields) for fields, _ in batch
+        ])
+        NotesTags.objects.bulk_create([NotesTags(notes_id=note, tags_id=tags[name])
+                                       for note, (_, names) in zip(notes, batch) for name in names])
+        public_counts = Counter(tags[name].pk for note, (_, names) in zip(notes, batch) if note.is_public
+                                for name in names)
+        by_delta = defaultdict(list)
+        for tag_id, delta in public_counts.items():
+            by_delta[delta].append(tag_id)
+        for delta, tag_ids in by_delta.items():
+            adjust_public_note_counts(tag_ids, delta)
+        update_search_index([note.pk for note in notes])
+    return notes
+
+
+def flush(user, batch, result):
+    try:
+        notes = insert_batch(user, [(fields, names) for _, fields, names in batch])
+    except DatabaseError:
+        if len(batch) == 1:
+            result.add_error(batch[0][0], {"__all__": ["The note could not be saved"]})
+            return False
+        # find the rows the database rejects, the others still go in
+        return any([flush(user, [row], result) for row in batch])
+    result.imported += len(notes)
+    return any(note.is_public for note in notes)
+
+
+def file_size(file):
+    if getattr(file, "size", None) is not None:
+        return file.size
+    position = file.seek(0, io.SEEK_END)
+    file.seek(0)
+    return position
+
+
+def import_notes(user, file, fmt, batch_size=None, progress=None):
+    """Import the notes of an uploaded or opened binary file for the user, returns an ImportResult"""
+    batch_size = batch_size or settings.NOTES_IMPORT_BATCH_SIZE
+    progress = progress or (lambda result: None)
+    result = ImportResult()
+    if file_size(file) > settings.NOTES_IMPORT_MAX_SIZE:
+        result.add_error("file", {"__all__": [f"The file is larger than {settings.NOTES_IMPORT_MAX_SIZE} bytes"]})
+        return result
+    batch = []
+    public = False
+    try:
+        for where, row in READERS[fmt](file):
+            fields, names, errors = clean_row(row)
+            if errors:
+                result.add_error(where, errors)
+                continue
+            batch.append((where, fields, names))
+            if len(batch) >= batch_size:
+                public = flush(user, batch, result) or public
+                batch = []
+                progress(result)
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, ImportFileError) as exc:
+        result.add_error("file", {"__all__": [f"The file could not be read: {exc}"]})
+    if batch:
+        public = flush(user, batch, result) or public
+        progress(result)
+    if result.imported:
+        recompute_profile_stats([user.pk])
+    if public:
+        bump_feed_version()
+    return result
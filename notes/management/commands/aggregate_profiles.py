@@ -0,0 +1,35 @@
+import pstats
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from StudyNotes.profiling import read_collapsed, view_directory
+
+
+class Command(BaseCommand):
+    help = "Merge the request profiles stored under PROFILING_DIR into flamegraph-ready collapsed stacks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", help="only the profiles of this view name")
+        parser.add_argument("--output", help="file for the collapsed stacks, stdout by default")
+        parser.add_argument("--pstats-output", help="file for the merged cProfile stats")
+
+    def handle(self, *args, **options):
+        directory = view_directory(options["view"]) if options["view"] else Path(settings.PROFILING_DIR)
+        if not directory.is_dir():
+            raise CommandError(f"No profiles in {directory}")
+        collapsed = sorted(directory.rglob("*.collapsed"))
+        cprofiles = sorted(directory.rglob("*.prof"))
+
+        stacks = read_collapsed(collapsed)
+        lines = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        if options["output"]:
+            Path(options["output"]).write_text(lines)
+        elif lines:
+            self.stdout.write(lines, ending="")
+        if cprofiles and options["pstats_output"]:
+            stats = pstats.Stats(*map(str, cprofiles))
+            stats.dump_stats(options["pstats_output"])
+        self.stderr.write(f"Merged {len(collapsed)} stack profiles into {len(stacks)} stacks"
+                          + (f" and {len(cprofiles)} cProfile profiles" if cprofiles else ""))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from notes.caching import bump_note_version
+from notes.models import Notes
+from notes.utils import make_excerpt
+
+
+class Command(BaseCommand):
+    help = "Regenerate the plain-text excerpt of every note from its description"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        last_pk, total = 0, 0
+        while True:
+            notes = list(Notes.objects.filter(pk__gt=last_pk).order_by("pk")
+                         .only("id", "description", "excerpt")[:options["chunk_size"]])
+            if not notes:
+                break
+            changed = []
+            for note in notes:
+                excerpt = make_excerpt(note.description)
+                if excerpt != note.excerpt:
+                    note.excerpt = excerpt
+                    changed.append(note)
+            Notes.objects.bulk_update(changed, ["excerpt"])
+            # bulk_update skips post_save, the cached cards of these notes are dropped like a save would
+            for note in changed:
+                bump_note_version(note.pk)
+            last_pk = notes[-1].pk
+            total += len(notes)
+            self.stdout.write(f"backfilled {total} notes")
+        self.stdout.write(self.style.SUCCESS(f"Excerpts backfilled for {total} notes"))
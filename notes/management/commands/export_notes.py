@@ -0,0 +1,34 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.export import FORMATS, export_notes
+
+
+class Command(BaseCommand):
+    help = "Stream the notes of one user, or of every user, as JSONL, CSV or a ZIP of Markdown files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="email of the user, every user's notes by default")
+        parser.add_argument("--format", choices=list(FORMATS), default="jsonl")
+        parser.add_argument("--output", help="file to write, stdout by default")
+        parser.add_argument("--chunk-size", type=int, help="notes per cursor fetch, NOTES_EXPORT_CHUNK_SIZE by default")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(email=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+        chunks = export_notes(options["format"], user, options["chunk_size"])
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,36 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.importing import READERS, guess_format, import_notes
+
+
+class Command(BaseCommand):
+    help = "Import notes for a user from JSONL, CSV or a ZIP of Markdown files, in batched transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--user", required=True, help="email of the owner of the imported notes")
+        parser.add_argument("--format", choices=list(READERS), help="guessed from the file extension by default")
+        parser.add_argument("--batch-size", type=int, help="notes per transaction, NOTES_IMPORT_BATCH_SIZE by default")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+        fmt = options["format"] or guess_format(options["path"])
+        if fmt is None:
+            raise CommandError("Can't tell the format from the file name, pass --format")
+
+        def progress(result):
+            self.stderr.write(f"imported {result.imported} notes, {result.failed} rows failed")
+
+        with open(options["path"], "rb") as file:
+            result = import_notes(user, file, fmt, options["batch_size"], progress)
+        for error in result.errors:
+            self.stderr.write(f"{error['row']}: {json.dumps(error['errors'])}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more failed rows")
+        self.stdout.write(f"Imported {result.imported} notes, {result.failed} rows failed")
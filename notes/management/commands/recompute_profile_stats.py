@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from notes.stats import recompute_profile_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the profile stats of every user"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        last_pk, total = 0, 0
+        while True:
+            ids = list(get_user_model().objects.filter(pk__gt=last_pk).order_by("pk")
+                       .values_list("pk", flat=True)[:options["chunk_size"]])
+            if not ids:
+                break
+            recompute_profile_stats(ids)
+            last_pk = ids[-1]
+            total += len(ids)
+            self.stdout.write(f"recomputed {total} users")
+        self.stdout.write(self.style.SUCCESS(f"Profile stats recomputed for {total} users"))
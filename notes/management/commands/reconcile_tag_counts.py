@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from notes.tagging import reconcile_public_note_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the public notes of every tag and repair counters that have drifted"
+
+    def handle(self, *args, **options):
+        repaired = reconcile_public_note_counts()
+        self.stdout.write(self.style.SUCCESS(f"Repaired public note counts of {repaired} tags"))
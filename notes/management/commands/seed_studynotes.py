@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from notes.seeding import seed
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, tags, notes and likes with realistic distributions for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--notes", type=int, default=100000)
+        parser.add_argument("--tags", type=int, default=5000, help="size of the tag vocabulary")
+        parser.add_argument("--tags-per-note", type=int, default=3, help="average number of tags of a note")
+        parser.add_argument("--tag-skew", type=float, default=1.1, help="Zipf exponent of tag popularity")
+        parser.add_argument("--like-skew", type=float, default=1.2,
+                            help="Pareto shape of likes per public note, lower means a heavier tail")
+        parser.add_argument("--max-likes", type=int, default=1000)
+        parser.add_argument("--paragraphs", type=int, default=3, help="average number of paragraphs of a description")
+        parser.add_argument("--paragraph-words", type=int, default=60)
+        parser.add_argument("--public-ratio", type=float, default=0.6)
+        parser.add_argument("--days", type=int, default=365, help="notes are spread over the last DAYS days")
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument("--copy", action="store_true", help="load rows with COPY, PostgreSQL only")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--skip-search-index", action="store_true",
+                            help="leave search vectors to a later update_search_index run")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["tags"] < 1 or options["paragraphs"] < 1:
+            raise CommandError("--users, --tags and --paragraphs must be at least 1")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy is only supported on PostgreSQL")
+        started = time.monotonic()
+        counts = seed(users=options["users"], notes=options["notes"], tags=options["tags"],
+                      tags_per_note=options["tags_per_note"], tag_skew=options["tag_skew"],
+                      like_skew=options["like_skew"], max_likes=options["max_likes"],
+                      paragraphs=options["paragraphs"], paragraph_words=options["paragraph_words"],
+                      public_ratio=options["public_ratio"], days=options["days"],
+                      chunk_size=options["chunk_size"], use_copy=options["copy"], seed=options["seed"],
+                      search_index=not options["skip_search_index"], progress=self.stdout.write)
+        summary = ", ".join(f"{total} {name.replace('_', ' ')}" for name, total in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary} in {time.monotonic() - started:.1f}s"))
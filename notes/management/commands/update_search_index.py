@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from notes.models import Notes
+from notes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = "Recompute the full-text search document and vector of every note"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        last_pk, total = 0, 0
+        while True:
+            ids = list(Notes.objects.filter(pk__gt=last_pk).order_by("pk")
+                       .values_list("pk", flat=True)[:options["chunk_size"]])
+            if not ids:
+                break
+            update_search_index(ids)
+            last_pk = ids[-1]
+            total += len(ids)
+            self.stdout.write(f"indexed {total} notes")
+        self.stdout.write(self.style.SUCCESS(f"Search index updated for {total} notes"))
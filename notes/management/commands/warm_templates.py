@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from StudyNotes.templating import WARM_UP_APPS, warm_templates
+
+
+class Command(BaseCommand):
+    help = ("Compile every template of the notes and accounts apps, e.g. before a deploy to catch syntax errors. "
+            "Workers warm their own cache on startup with TEMPLATES_WARM_UP")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--app", action="append", dest="apps", choices=WARM_UP_APPS,
+                            help="only the templates of this app, can be repeated")
+
+    def handle(self, *args, **options):
+        timings, errors = warm_templates(options["apps"])
+        if options["verbosity"] > 1:
+            for name, seconds in timings.items():
+                self.stdout.write(f"{name}: {seconds * 1000:.2f} ms")
+        for name, error in errors.items():
+            self.stderr.write(f"{name}: {error}")
+        self.stdout.write(f"Compiled {len(timings)} templates in {sum(timings.values()) * 1000:.2f} ms")
+        if errors:
+            raise CommandError(f"{len(errors)} templates could not be compiled")
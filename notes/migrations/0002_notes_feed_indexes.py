@@ -0,0 +1,21 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at', '-id'], name='notes_public_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notes_user_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_like_count(apps, schema_editor):
+    Notes = apps.get_model("notes", "Notes")
+    UserLikes = apps.get_model("notes", "UserLikes")
+    duplicates = UserLikes.objects.values("notes", "users").annotate(keep=Min("id"), total=Count("id"))\
+        .filter(total__gt=1)
+    for row in duplicates:
+        UserLikes.objects.filter(notes=row["notes"], users=row["users"]).exclude(id=row["keep"]).delete()
+    likes = UserLikes.objects.filter(notes=OuterRef("pk")).order_by().values("notes")\
+        .annotate(total=Count("id")).values("total")
+    Notes.objects.update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_notes_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notes',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_like_count, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userlikes',
+            constraint=models.UniqueConstraint(fields=('notes', 'users'), name='unique_notes_users'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:46
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes only exist on PostgreSQL, SQLite test runs search the plain-text document instead
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE INDEX notes_search_vector_idx ON notes_notes USING gin (search_vector)")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS notes_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_notes_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notes',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='notes',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0004_notes_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notes',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:49
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_tags(apps, schema_editor):
+    NotesTags = apps.get_model("notes", "NotesTags")
+    duplicates = NotesTags.objects.values("notes_id", "tags_id").annotate(keep=Min("id"), total=Count("id"))\
+        .filter(total__gt=1)
+    for row in duplicates:
+        NotesTags.objects.filter(notes_id=row["notes_id"], tags_id=row["tags_id"]).exclude(id=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_notes_excerpt'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_tags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notestags',
+            constraint=models.UniqueConstraint(fields=('tags_id', 'notes_id'), name='unique_tags_notes'),
+        ),
+    ]
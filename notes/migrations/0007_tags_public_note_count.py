@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_public_notes(apps, schema_editor):
+    Tags = apps.get_model("notes", "Tags")
+    NotesTags = apps.get_model("notes", "NotesTags")
+    public_notes = NotesTags.objects.filter(tags_id=OuterRef("pk"), notes_id__is_public=True).order_by()\
+        .values("tags_id").annotate(total=Count("id")).values("total")
+    Tags.objects.update(public_note_count=Coalesce(Subquery(public_notes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_notestags_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tags',
+            name='public_note_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_public_notes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tags',
+            index=models.Index(fields=['-public_note_count', 'tag'], name='tags_popularity_idx'),
+        ),
+    ]
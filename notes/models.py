@@ -1,40 +1,81 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 
 from django.conf import settings
-from django.db.models import UniqueConstraint
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import F, UniqueConstraint
 from tinymce import models as tinymce_models
 from accounts.models import CustomUser
+from .signals import like_toggled
+from .utils import make_excerpt
 
 
 class Notes(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=100)
     description = tinymce_models.HTMLField()
+    # plain-text preview of the description shown on feed cards
+    excerpt = models.TextField(blank=True, default="", editable=False)
     # video 
     link = models.URLField()
     is_public = models.BooleanField(default=False)
+    like_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(settings.AUTH_USER_MODEL, through="UserLikes", related_name="note_likes")
+    # plain text of title, tags and description, kept up to date by notes.search.update_search_index
+    search_document = models.TextField(blank=True, default="", editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], condition=models.Q(is_public=True),
+                         name="notes_public_feed_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="notes_user_feed_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # post_save receivers compare against it to notice notes joining or leaving the public feed
+        instance.loaded_is_public = instance.__dict__.get("is_public")
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "description" in update_fields:
+            self.excerpt = make_excerpt(self.description)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "excerpt"}
+        super().save(*args, **kwargs)
+        self.loaded_is_public = self.is_public
+
     def add_like(self, user_id):
-        user = CustomUser.objects.get(id=user_id)
-        like, created = UserLikes.objects.get_or_create(notes=self, users=user)
-        if not created and like.value == "Unlike":
-            like.value = "Like"
-            like.save()
-        self.likes.add(user)
+        _, created = UserLikes.objects.get_or_create(notes_id=self.pk, users_id=user_id, defaults={"value": "Like"})
+        if created:
+            Notes.objects.filter(pk=self.pk).update(like_count=F("like_count") + 1)
+            like_toggled.send(sender=Notes, note_id=self.pk, user_id=user_id, liked=True)
 
     def remove_like(self, user_id):
-        user = CustomUser.objects.get(id=user_id)
-        like = UserLikes.objects.get(notes=self, users=user)
-        if like:
-            if like.value == "Like":
-                like.value = "Unlike"
-                like.save()
-            self.likes.remove(user)
+        deleted, _ = UserLikes.objects.filter(notes_id=self.pk, users_id=user_id).delete()
+        if deleted:
+            Notes.objects.filter(pk=self.pk).update(like_count=F("like_count") - 1)
+            like_toggled.send(sender=Notes, note_id=self.pk, user_id=user_id, liked=False)
+
+    def toggle_like(self, user_id):
+        """Flip the like of the user and adjust like_count in one transaction, returns True if the note is now liked"""
+        try:
+            with transaction.atomic():
+                deleted, _ = UserLikes.objects.filter(notes_id=self.pk, users_id=user_id).delete()
+                if not deleted:
+                    UserLikes.objects.create(notes_id=self.pk, users_id=user_id, value="Like")
+                Notes.objects.filter(pk=self.pk).update(like_count=F("like_count") + (-1 if deleted else 1))
+                like_toggled.send(sender=Notes, note_id=self.pk, user_id=user_id, liked=not deleted)
+        except IntegrityError:
+            # a concurrent request of the same user has already liked the note
+            return True
+        return not deleted
 
     def __str__(self):
         return self.title
@@ -43,9 +84,16 @@ class Notes(models.Model):
 class Tags(models.Model):
     tag = models.CharField(max_length=80, unique=True)
     note = models.ManyToManyField(Notes, through='NotesTags')
+    # number of public notes with the tag, maintained by notes.handlers
+    public_note_count = models.PositiveIntegerField(default=0)
 
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-public_note_count", "tag"], name="tags_popularity_idx"),
+        ]
+
     def __str__(self):
         return self.tag
 
@@ -55,7 +103,9 @@ class NotesTags(models.Model):
     tags_id = models.ForeignKey(Tags, on_delete=models.CASCADE)
 
     class Meta:
-        UniqueConstraint(fields=["tags_id", "notes_id"], name="unique_tags_notes")
+        constraints = [
+            UniqueConstraint(fields=["tags_id", "notes_id"], name="unique_tags_notes"),
+        ]
 
 
 LIKE_CHOICES = (
@@ -72,4 +122,21 @@ class UserLikes(models.Model):
     objects = models.Manager()
 
     class Meta:
-        UniqueConstraint(fields=["notes", "users"], name="unique_notes_users")
\ No newline at end of file
+        constraints = [
+            UniqueConstraint(fields=["notes", "users"], name="unique_notes_users"),
+        ]
+
+
+class ProfileStats(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name="profile_stats")
+    note_count = models.PositiveIntegerField(default=0)
+    public_note_count = models.PositiveIntegerField(default=0)
+    total_tags = models.PositiveIntegerField(default=0)
+    distinct_tags = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return f"{self.user_id} stats"
@@ -0,0 +1,110 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+
+def encode_cursor(note):
+    raw = f"{note.created_at.isoformat()}|{note.pk}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError as exc:
+        raise BadRequest("Invalid cursor") from exc
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.GET.get("page_size", settings.NOTES_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.NOTES_PAGE_SIZE
+    return max(1, min(page_size, settings.NOTES_MAX_PAGE_SIZE))
+
+
+class CursorPage:
+    def __init__(self, object_list, page_size, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def page_queryset(queryset, cursor, direction, page_size):
+    """
+    Keyset query over (created_at, id) fetching one row more than the page, newest first.
+    The leading created_at range keeps the filter on the feed indexes, so any page costs the same as the first one.
+    """
+    if cursor and direction == "before":
+        created_at, pk = decode_cursor(cursor)
+        return queryset.filter(Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk)))\
+            .order_by("created_at", "id")[:page_size + 1]
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk)))
+    return queryset[:page_size + 1]
+
+
+def make_page(rows, cursor, direction, page_size):
+    """CursorPage of the rows fetched with page_queryset, None when nothing is newer than a "before" cursor"""
+    if cursor and direction == "before":
+        if not rows:
+            return None
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return CursorPage(rows, page_size,
+                          next_cursor=encode_cursor(rows[-1]),
+                          previous_cursor=encode_cursor(rows[0]) if has_previous else None)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return CursorPage(rows, page_size,
+                      next_cursor=encode_cursor(rows[-1]) if has_next else None,
+                      previous_cursor=encode_cursor(rows[0]) if cursor and rows else None)
+
+
+def paginate_notes(queryset, cursor=None, direction="after", page_size=None):
+    page_size = page_size or settings.NOTES_PAGE_SIZE
+    page = make_page(list(page_queryset(queryset, cursor, direction, page_size)), cursor, direction, page_size)
+    if page is None:
+        return paginate_notes(queryset, page_size=page_size)
+    return page
+
+
+async def apaginate_notes(queryset, cursor=None, direction="after", page_size=None):
+    page_size = page_size or settings.NOTES_PAGE_SIZE
+    rows = [row async for row in page_queryset(queryset, cursor, direction, page_size)]
+    page = make_page(rows, cursor, direction, page_size)
+    if page is None:
+        return await apaginate_notes(queryset, page_size=page_size)
+    return page
+
+
+def get_cursor(request):
+    if request.GET.get("before"):
+        return request.GET["before"], "before"
+    return request.GET.get("after"), "after"
+
+
+def paginate_request(queryset, request):
+    return paginate_notes(queryset, *get_cursor(request), get_page_size(request))
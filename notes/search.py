@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Case, F, Prefetch, Value, When
+
+from .models import Notes, Tags
+from .utils import html_to_text
+
+
+def update_search_index(note_ids):
+    """
+    Recompute the search document and vector of the given notes.
+    Title, tags and description text are weighted A, B and C on PostgreSQL.
+    """
+    notes = Notes.objects.filter(pk__in=note_ids).only("id", "title", "description")\
+        .prefetch_related(Prefetch("tags_set", queryset=Tags.objects.only("id", "tag")))
+    for note in notes:
+        tags = " ".join(tag.tag for tag in note.tags_set.all())
+        body = html_to_text(note.description)
+        values = {"search_document": " ".join(filter(None, [note.title, tags, body]))}
+        if connections[notes.db].vendor == "postgresql":
+            config = settings.NOTES_SEARCH_CONFIG
+            values["search_vector"] = (SearchVector(Value(note.title), weight="A", config=config)
+                                       + SearchVector(Value(tags), weight="B", config=config)
+                                       + SearchVector(Value(body), weight="C", config=config))
+        Notes.objects.filter(pk=note.pk).update(**values)
+
+
+def search_notes(queryset, query):
+    """Filter the queryset down to notes matching the query, best matches first"""
+    query = " ".join(query.split())
+    if connections[queryset.db].vendor == "postgresql":
+        search_query = SearchQuery(query, search_type="websearch", config=settings.NOTES_SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query)\
+            .annotate(rank=SearchRank(F("search_vector"), search_query))\
+            .order_by("-rank", "-created_at", "-id")
+
+    # SQLite test runs: every term has to appear in the precomputed plain-text document,
+    # title matches rank higher
+    terms = query.split()
+    rank = Value(0.0)
+    for term in terms:
+        queryset = queryset.filter(search_document__icontains=term)
+        rank = rank + Case(When(title__icontains=term, then=Value(1.0)), default=Value(0.4))
+    return queryset.annotate(rank=rank).order_by("-rank", "-created_at", "-id")
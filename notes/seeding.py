@@ -0,0 +1,168 @@
+import csv
+import io
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .caching import bump_feed_version
+from .models import Notes, NotesTags, UserLikes
+from .search import update_search_index
+from .stats import recompute_profile_stats
+from .tagging import reconcile_public_note_counts, resolve_tags
+from .utils import EXCERPT_WORDS, html_to_text, make_excerpt
+
+WORDS = (
+    "algebra", "algorithm", "anatomy", "array", "biology", "cache", "calculus", "cell", "chemistry", "circuit",
+    "class", "compiler", "data", "database", "derivative", "design", "django", "economics", "energy", "enzyme",
+    "equation", "essay", "exam", "function", "genetics", "geometry", "grammar", "graph", "history", "index",
+    "integral", "java", "kernel", "language", "lecture", "linux", "literature", "logic", "matrix", "memory",
+    "method", "model", "network", "neuron", "notes", "object", "optics", "organic", "pattern", "philosophy",
+    "physics", "pointer", "poetry", "probability", "process", "protein", "proof", "python", "query", "queue",
+    "reaction", "recursion", "revision", "sorting", "spanish", "statistics", "summary", "syntax", "theorem",
+    "thermodynamics", "thread", "tree", "vector", "velocity", "vocabulary", "wave", "writing",
+)
+PASSWORD = "studynotes"
+PARAGRAPH_POOL_SIZE = 1000
+
+
+def zipf_cum_weights(size, skew):
+    """Cumulative weights for random.choices, the item of rank r is drawn with probability ~ 1 / r**skew"""
+    return list(accumulate(1 / rank ** skew for rank in range(1, size + 1)))
+
+
+def make_paragraph(rng, words):
+    # more than EXCERPT_WORDS words, so the excerpt of a description is the excerpt of its first paragraph
+    text = rng.choices(WORDS, k=max(EXCERPT_WORDS + 1, rng.randint(words // 2, words * 3 // 2)))
+    kind = rng.random()
+    if kind < 0.15:
+        items = "\n".join(f"<li>{' '.join(text[i:i + 8])}</li>" for i in range(0, len(text), 8))
+        return f"<ul>{items}</ul>"
+    if kind < 0.3:
+        return f"<p><strong>{' '.join(text[:4])}</strong> {' '.join(text[4:])}</p>"
+    if kind < 0.4:
+        return f"<p>{' '.join(text[:-3])} <a href=\"https://example.com/{text[-1]}\">{' '.join(text[-3:])}</a></p>"
+    return f"<p>{' '.join(text)}</p>"
+
+
+def make_paragraph_pool(rng, words):
+    """(html, text, excerpt) of paragraphs descriptions are assembled from, parsing HTML once per paragraph"""
+    pool = []
+    for _ in range(PARAGRAPH_POOL_SIZE):
+        html = make_paragraph(rng, words)
+        pool.append((html, html_to_text(html), make_excerpt(html)))
+    return pool
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+
+def insert_rows(model, fields, rows, use_copy=False):
+    """Insert raw rows, with COPY on PostgreSQL when use_copy is set, skipping model save() and signals"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ", ".join(quote(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        if use_copy:
+            buffer = io.StringIO()
+            csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ", ".join(["%s"] * len(fields))
+            cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+
+
+def seed_users(rng, count, chunk_size):
+    User = get_user_model()
+    first_id = next_id(User)
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([User(pk=pk, email=f"seed{pk}@studynotes.local",
+                                   name=" ".join(rng.choices(WORDS, k=2)).title(), password=password)
+                              for pk in range(first_id, first_id + count)], batch_size=chunk_size)
+    return range(first_id, first_id + count)
+
+
+def seed_tags(count):
+    """Tags ordered by popularity rank, word tags first"""
+    names = [WORDS[i % len(WORDS)] + (f" {i // len(WORDS)}" if i >= len(WORDS) else "") for i in range(count)]
+    tags = {}
+    for start in range(0, count, 5000):
+        tags.update((tag.tag, tag) for tag in resolve_tags(names[start:start + 5000]))
+    return [tags[name] for name in names]
+
+
+def seed(*, users, notes, tags, tags_per_note=3, tag_skew=1.1, like_skew=1.2, max_likes=1000, paragraphs=3,
+         paragraph_words=60, public_ratio=0.6, days=365, chunk_size=10000, use_copy=False, seed=0,
+         search_index=True, progress=None):
+    """
+    Generate users, tags, notes, note tags and likes in chunks.
+    Tag popularity follows a Zipf distribution, like counts a Pareto one, and descriptions have on average the given
+    number of rich-text paragraphs. The same seed generates the same rows apart from ids and timestamps.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda message: None)
+    user_ids = seed_users(rng, users, chunk_size)
+    tag_rows = seed_tags(tags)
+    tag_weights = zipf_cum_weights(len(tag_rows), tag_skew)
+    pool = make_paragraph_pool(rng, paragraph_words)
+    first_note_id = next_id(Notes)
+    started_at = timezone.now() - timedelta(days=days)
+    step = timedelta(days=days) / max(notes, 1)
+    adapt = connection.ops.adapt_datetimefield_value
+    note_fields = ["id", "user", "title", "description", "excerpt", "link", "is_public", "like_count",
+                   "created_at", "updated_at", "search_document"]
+    counts = {"users": users, "tags": tags, "notes": 0, "notes_tags": 0, "likes": 0}
+
+    for start in range(0, notes, chunk_size):
+        note_rows, notes_tags_rows, like_rows = [], [], []
+        for i in range(start, min(start + chunk_size, notes)):
+            note_id = first_note_id + i
+            owner = rng.choice(user_ids)
+            title = " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize()
+            parts = rng.choices(pool, k=rng.randint(1, 2 * paragraphs - 1))
+            description = "\n".join(part[0] for part in parts)
+            is_public = rng.random() < public_ratio
+            note_tags = list(dict.fromkeys(rng.choices(tag_rows, cum_weights=tag_weights,
+                                                       k=rng.randint(0, 2 * tags_per_note))))
+            notes_tags_rows += [(note_id, tag.pk) for tag in note_tags]
+            like_count = 0
+            if is_public:
+                like_count = min(int(rng.paretovariate(like_skew)) - 1, max_likes, len(user_ids) - 1)
+                fans = [fan for fan in rng.sample(user_ids, like_count + 1) if fan != owner][:like_count]
+                like_rows += [(note_id, fan, "Like") for fan in fans]
+            document = " ".join(filter(None, [title, " ".join(tag.tag for tag in note_tags),
+                                              " ".join(part[1] for part in parts)]))
+            created_at = adapt(started_at + step * i)
+            note_rows.append((note_id, owner, title, description, parts[0][2], f"https://example.com/{note_id}",
+                              is_public, like_count, created_at, created_at, document))
+        with transaction.atomic():
+            insert_rows(Notes, note_fields, note_rows, use_copy)
+            insert_rows(NotesTags, ["notes_id", "tags_id"], notes_tags_rows, use_copy)
+            insert_rows(UserLikes, ["notes", "users", "value"], like_rows, use_copy)
+        counts["notes"] += len(note_rows)
+        counts["notes_tags"] += len(notes_tags_rows)
+        counts["likes"] += len(like_rows)
+        progress(f"inserted {counts['notes']} notes, {counts['notes_tags']} note tags, {counts['likes']} likes")
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [get_user_model(), Notes]):
+            cursor.execute(sql)
+    reconcile_public_note_counts()
+    for start in range(0, users, chunk_size):
+        recompute_profile_stats(user_ids[start:start + chunk_size])
+    progress("recomputed tag counts and profile stats")
+    if search_index and connection.vendor == "postgresql":
+        # search_document is written above, the weighted vector needs a pass per note
+        for start in range(first_note_id, first_note_id + notes, chunk_size):
+            update_search_index(range(start, min(start + chunk_size, first_note_id + notes)))
+            progress(f"indexed {min(start + chunk_size, first_note_id + notes) - first_note_id} notes")
+    bump_feed_version()
+    return counts
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# sent after a like of the note was added or removed, provides note_id, user_id and liked
+like_toggled = Signal()
+
+# sent after the tags of the note were replaced, provides note and the added and removed tag ids
+tags_changed = Signal()
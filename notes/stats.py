@@ -0,0 +1,48 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Notes, NotesTags, ProfileStats
+
+STAT_FIELDS = ("note_count", "public_note_count", "total_tags", "distinct_tags", "likes_received")
+
+
+def recompute_profile_stats(user_ids):
+    """Recount the stats of the given users with two grouped queries and upsert them"""
+    stats = {user_id: ProfileStats(user_id=user_id) for user_id in user_ids}
+    notes = Notes.objects.filter(user_id__in=user_ids).order_by().values("user_id")\
+        .annotate(note_count=Count("id"), public_note_count=Count("id", filter=Q(is_public=True)),
+                  likes_received=Sum("like_count"))
+    tags = NotesTags.objects.filter(notes_id__user_id__in=user_ids).order_by().values("notes_id__user_id")\
+        .annotate(total_tags=Count("id"), distinct_tags=Count("tags_id", distinct=True))
+    for row in notes:
+        for field in ("note_count", "public_note_count", "likes_received"):
+            setattr(stats[row["user_id"]], field, row[field] or 0)
+    for row in tags:
+        stats[row["notes_id__user_id"]].total_tags = row["total_tags"]
+        stats[row["notes_id__user_id"]].distinct_tags = row["distinct_tags"]
+    ProfileStats.objects.bulk_create(stats.values(), update_conflicts=True, unique_fields=["user"],
+                                     update_fields=STAT_FIELDS)
+    return stats
+
+
+def get_profile_stats(user):
+    stats = ProfileStats.objects.filter(user=user).first()
+    if stats is None:
+        stats = recompute_profile_stats([user.pk])[user.pk]
+    return stats
+
+
+def adjust_profile_stats(stats, **deltas):
+    """
+    Apply counter deltas to a ProfileStats queryset.
+    Missing rows are left alone, they are computed from scratch on the first read.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        stats.update(**changes)
+
+
+def refresh_distinct_tags(user_id):
+    distinct_tags = NotesTags.objects.filter(notes_id__user_id=OuterRef("user_id")).order_by()\
+        .values("notes_id__user_id").annotate(total=Count("tags_id", distinct=True)).values("total")
+    ProfileStats.objects.filter(user_id=user_id).update(distinct_tags=Coalesce(Subquery(distinct_tags), 0))
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .autocomplete import tag_index
+from .models import Notes, NotesTags, Tags
+from .signals import tags_changed
+
+
+def normalize_tag(tag):
+    return " ".join(tag.split()).lower()
+
+
+def normalize_tags(tags):
+    """Cleaned, deduplicated tag names in submission order"""
+    return list(dict.fromkeys(normalize_tag(tag) for tag in tags if tag and tag.strip()))
+
+
+def resolve_tags(names):
+    """Tags rows for the given names, missing ones are created with a single insert"""
+    if not names:
+        return []
+    Tags.objects.bulk_create([Tags(tag=name) for name in names], ignore_conflicts=True)
+    tag_index.add(names)
+    return list(Tags.objects.filter(tag__in=names))
+
+
+def set_note_tags(note, tags):
+    """Replace the tags of the note, the number of queries doesn't depend on the number of tags"""
+    # inside the views' transaction no savepoint is needed, a failure rolls the whole update back
+    with transaction.atomic(savepoint=False):
+        resolved = {tag.pk: tag for tag in resolve_tags(normalize_tags(tags))}
+        current = set(NotesTags.objects.filter(notes_id=note).values_list("tags_id", flat=True))
+        added, removed = resolved.keys() - current, current - resolved.keys()
+        if removed:
+            NotesTags.objects.filter(notes_id=note, tags_id__in=removed).delete()
+        if added:
+            NotesTags.objects.bulk_create([NotesTags(notes_id=note, tags_id=resolved[pk]) for pk in added])
+        if added or removed:
+            Notes.objects.filter(pk=note.pk).update(updated_at=timezone.now())
+            tags_changed.send(sender=Notes, note=note, added=added, removed=removed)
+    return list(resolved.values())
+
+
+def adjust_public_note_counts(tag_ids, delta):
+    if tag_ids:
+        Tags.objects.filter(pk__in=tag_ids).update(public_note_count=F("public_note_count") + delta)
+
+
+def reconcile_public_note_counts():
+    """Recount public notes of every tag, returns the number of tags that had drifted"""
+    public_notes = NotesTags.objects.filter(tags_id=OuterRef("pk"), notes_id__is_public=True).order_by()\
+        .values("tags_id").annotate(total=Count("id")).values("total")
+    actual = Coalesce(Subquery(public_notes), 0)
+    return Tags.objects.annotate(actual=actual).exclude(public_note_count=F("actual"))\
+        .update(public_note_count=actual)
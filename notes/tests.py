@@ -1,5 +1,41 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import time
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Count, F, Q
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
 from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils.http import urlencode
+from . import async_views, views
+from .autocomplete import TagIndex, autocomplete_tags, tag_index
+from .models import Notes, ProfileStats, Tags, UserLikes
+from .pagination import paginate_notes
+from .search import search_notes
+from .stats import STAT_FIELDS, get_profile_stats, recompute_profile_stats
+from .tagging import set_note_tags
+from .utils import make_excerpt
+
+
+class NotesTestCase(TestCase):
+
+    def setUp(self):
+        caches[settings.NOTES_CACHE_ALIAS].clear()
 
 
 class UserManagersTests(TestCase):
@@ -35,3 +71,666 @@ class UserManagersTests(TestCase):
             ...
         with self.assertRaises(ValueError):
             User.objects.create_superuser(email='giga@user.com', password='rrrr', is_superuser=False)
+
+
+class FeedPaginationTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='feed@user.com', password='rrr')
+        cls.notes = [Notes.objects.create(user=cls.user, title=f"note {i}", description="text", is_public=True)
+                     for i in range(5)]
+        # identical timestamps must still be ordered by id
+        Notes.objects.filter(pk__in=[n.pk for n in cls.notes[:3]]).update(created_at=cls.notes[0].created_at)
+
+    def test_walk_forward_and_back(self):
+        qs = Notes.objects.filter(is_public=True)
+        expected = list(qs.order_by("-created_at", "-id"))
+        first = paginate_notes(qs, page_size=2)
+        self.assertEqual(list(first), expected[:2])
+        self.assertFalse(first.has_previous)
+        second = paginate_notes(qs, first.next_cursor, page_size=2)
+        self.assertEqual(list(second), expected[2:4])
+        third = paginate_notes(qs, second.next_cursor, page_size=2)
+        self.assertEqual(list(third), expected[4:])
+        self.assertFalse(third.has_next)
+        back = paginate_notes(qs, third.previous_cursor, "before", page_size=2)
+        self.assertEqual(list(back), expected[2:4])
+        self.assertEqual(list(paginate_notes(qs, back.previous_cursor, "before", page_size=2)), expected[:2])
+
+    def test_public_feed_view(self):
+        response = self.client.get(reverse("public_notes"), {"page_size": 2})
+        self.assertEqual(len(response.context["page"]), 2)
+        self.assertTrue(response.context["page"].has_next)
+        self.assertEqual(self.client.get(reverse("public_notes"), {"after": "not-a-cursor"}).status_code, 400)
+
+
+class LikeToggleTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.author = User.objects.create_user(email='author@user.com', password='rrr')
+        cls.reader = User.objects.create_user(email='reader@user.com', password='rrr')
+        cls.note = Notes.objects.create(user=cls.author, title="liked", description="text", is_public=True)
+
+    def test_toggle_like(self):
+        with self.assertNumQueries(6):
+            self.assertTrue(self.note.toggle_like(self.reader.id))
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.like_count, 1)
+        self.assertFalse(self.note.toggle_like(self.reader.id))
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.like_count, 0)
+        self.assertFalse(UserLikes.objects.exists())
+
+    def test_like_view(self):
+        self.client.force_login(self.reader)
+        self.client.post(reverse("like_note"), {"note_id": self.note.id})
+        response = self.client.get(reverse("public_notes"))
+        self.assertEqual(response.context["liked_ids"], {self.note.id})
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.like_count, 1)
+
+
+class SearchTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='search@user.com', password='rrr')
+        cls.django_note = Notes.objects.create(user=cls.user, title="Django ORM", is_public=True,
+                                               description="<p>Querysets are <b>lazy</b></p>")
+        cls.other_note = Notes.objects.create(user=cls.user, title="Cooking", is_public=True,
+                                              description="<p>Django is also a movie</p>")
+        cls.private_note = Notes.objects.create(user=cls.user, title="Django secrets", description="private")
+
+    def test_index_is_updated_on_save_and_tag_change(self):
+        self.django_note.refresh_from_db()
+        self.assertEqual(self.django_note.search_document, "Django ORM Querysets are lazy")
+        set_note_tags(self.other_note, ["Recipes"])
+        self.assertEqual(list(search_notes(Notes.objects.all(), "recipes")), [self.other_note])
+
+    def test_ranked_public_results(self):
+        response = self.client.get(reverse("search_api"), {"q": "django"})
+        titles = [result["title"] for result in response.json()["results"]]
+        self.assertEqual(titles, ["Django ORM", "Cooking"])
+        self.assertEqual(self.client.get(reverse("search_api")).status_code, 400)
+
+
+class AsyncViewTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.author = User.objects.create_user(email='async@user.com', password='rrr')
+        cls.reader = User.objects.create_user(email='reader@user.com', password='rrr')
+        cls.note = Notes.objects.create(user=cls.author, title="Async ORM", description="aget", is_public=True)
+        cls.private_note = Notes.objects.create(user=cls.author, title="Async secrets", description="private")
+
+    def request(self, path, user=None, method="get", data=None):
+        if method == "post":
+            request = AsyncRequestFactory().post(path, urlencode(data), "application/x-www-form-urlencoded")
+        else:
+            request = AsyncRequestFactory().get(path, data)
+        request.user = user or AnonymousUser()
+        return request
+
+    async def test_public_feed_and_detail(self):
+        await async_views.like_view(self.request(reverse("like_note"), self.reader, "post", {"note_id": self.note.pk}))
+        response = await async_views.view_all_public_notes(self.request(reverse("public_notes"), self.reader))
+        self.assertContains(response, "Async ORM")
+        self.assertContains(response, "like-btn-liked.png")
+        self.assertNotContains(response, "Async secrets")
+        url = reverse("public_detail_view", args=[self.note.pk])
+        self.assertContains(await async_views.public_note_detail_view(self.request(url), self.note.pk), "aget")
+        with self.assertRaises(Http404):
+            await async_views.public_note_detail_view(self.request(url), self.private_note.pk)
+
+    async def test_pages_render_for_a_user_whose_renditions_are_not_made_yet(self):
+        # a fresh upload, the nav must not make the renditions, that would query from the event loop
+        self.reader.profile_img = "Users/2/photo.png"
+        self.reader.profile_thumbnails = {}
+        response = await async_views.view_all_public_notes(self.request(reverse("public_notes"), self.reader))
+        self.assertContains(response, 'src="/media/Users/2/photo.png"')
+        self.assertNotContains(response, "<source")
+
+        self.reader.profile_thumbnails = {"source": "Users/2/photo.png", "sizes": [32, 64, 150, 300],
+                                          "formats": ["webp", "jpeg"], "renditions": {
+            str(size): {fmt: f"Users/2/thumbnails/photo-{size}.{fmt}" for fmt in ("webp", "jpeg")}
+            for size in (32, 64, 150, 300)}}
+        url = reverse("public_detail_view", args=[self.note.pk])
+        response = await async_views.public_note_detail_view(self.request(url, self.reader), self.note.pk)
+        self.assertContains(response, "Users/2/thumbnails/photo-64.webp 1x")
+
+    async def test_search_api_matches_sync_view(self):
+        path = reverse("search_api") + "?q=async"
+        response = await async_views.search_api(self.request(path, self.author))
+        request = RequestFactory().get(path)
+        request.user = self.author
+        expected = await sync_to_async(views.search_api)(request)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(len(json.loads(response.content)["results"]), 2)
+
+    async def test_like_requires_login(self):
+        response = await async_views.like_view(self.request(reverse("like_note"), method="post",
+                                                            data={"note_id": self.note.pk}))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(await UserLikes.objects.aexists())
+
+
+class ExcerptTests(NotesTestCase):
+
+    def test_excerpt_generated_on_save_and_backfilled(self):
+        user = get_user_model().objects.create_user(email='excerpt@user.com', password='rrr')
+        words = " ".join(f"w{i}" for i in range(30))
+        note = Notes.objects.create(user=user, title="long", description=f"<p>{words} &amp;</p>", is_public=True)
+        self.assertEqual(note.excerpt, " ".join(f"w{i}" for i in range(20)) + "…")
+        Notes.objects.filter(pk=note.pk).update(excerpt="stale")
+        self.assertIn("stale", self.client.get(reverse("public_notes")).context["notes"][0]["html"])
+        call_command("backfill_excerpts", stdout=StringIO())
+        note.refresh_from_db()
+        self.assertTrue(note.excerpt.startswith("w0 w1"))
+        card = self.client.get(reverse("public_notes")).context["notes"][0]
+        self.assertIn(note.excerpt, card["html"])
+        self.assertNotIn("<p>", card["html"])
+
+
+class NoteCacheTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.author = User.objects.create_user(email='cached@user.com', password='rrr')
+        cls.reader = User.objects.create_user(email='visitor@user.com', password='rrr')
+        cls.note = Notes.objects.create(user=cls.author, title="cached", description="<p>body</p>", is_public=True)
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        self.client.get(reverse("public_notes"))
+        self.client.get(reverse("public_detail_view", args=[self.note.pk]))
+        with self.assertNumQueries(0):
+            self.client.get(reverse("public_notes"))
+            self.client.get(reverse("public_detail_view", args=[self.note.pk]))
+
+    def test_versions_are_bumped_on_changes(self):
+        self.client.get(reverse("public_detail_view", args=[self.note.pk]))
+        self.note.title = "edited"
+        self.note.save()
+        self.assertContains(self.client.get(reverse("public_detail_view", args=[self.note.pk])), "edited")
+        self.note.toggle_like(self.reader.id)
+        response = self.client.get(reverse("public_notes"))
+        self.assertEqual(response.context["notes"][0]["like_count"], 1)
+        self.note.is_public = False
+        self.note.save()
+        self.assertEqual(self.client.get(reverse("public_notes")).context["notes"], [])
+        self.assertEqual(self.client.get(reverse("public_detail_view", args=[self.note.pk])).status_code, 404)
+
+
+class TagServiceTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='tags@user.com', password='rrr')
+        cls.note = Notes.objects.create(user=cls.user, title="tagged", description="text")
+
+    def test_query_count_does_not_depend_on_tag_count(self):
+        with self.assertNumQueries(10):
+            set_note_tags(self.note, [f"tag {i}" for i in range(10)])
+        with self.assertNumQueries(11):
+            set_note_tags(self.note, ["  Tag   0 ", "tag 0", "new"])
+        self.assertEqual(sorted(self.note.tags_set.values_list("tag", flat=True)), ["new", "tag 0"])
+        self.assertEqual(Tags.objects.count(), 11)
+
+    def test_update_note_view(self):
+        self.client.force_login(self.user)
+        data = {"title": "tagged", "description": "text", "link": "", "form-TOTAL_FORMS": "2",
+                "form-INITIAL_FORMS": "0", "form-0-tag": "python", "form-1-tag": "Django"}
+        self.client.post(reverse("update_note", args=[self.note.pk]), data)
+        self.assertEqual(sorted(self.note.tags_set.values_list("tag", flat=True)), ["django", "python"])
+        response = self.client.get(reverse("update_note", args=[self.note.pk]))
+        self.assertEqual(response.context["formset"].total_form_count(), 2)
+
+
+class TagCountTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='cloud@user.com', password='rrr')
+        cls.note = Notes.objects.create(user=cls.user, title="public", description="text", is_public=True)
+        cls.private_note = Notes.objects.create(user=cls.user, title="private", description="text")
+
+    def counts(self):
+        return dict(Tags.objects.values_list("tag", "public_note_count"))
+
+    def test_counts_follow_tags_visibility_and_deletes(self):
+        set_note_tags(self.note, ["python", "django"])
+        set_note_tags(self.private_note, ["python"])
+        self.assertEqual(self.counts(), {"python": 1, "django": 1})
+        set_note_tags(self.note, ["python"])
+        self.private_note.is_public = True
+        self.private_note.save()
+        self.assertEqual(self.counts(), {"python": 2, "django": 0})
+        self.note.delete()
+        self.assertEqual(self.counts(), {"python": 1, "django": 0})
+
+    def test_update_view_commits_visibility_and_tags_together(self):
+        set_note_tags(self.private_note, ["python"])
+        self.client.force_login(self.user)
+        data = {"title": "private", "description": "text", "link": "", "is_public": "on", "form-TOTAL_FORMS": "1",
+                "form-INITIAL_FORMS": "0", "form-0-tag": "python"}
+        with mock.patch("notes.views.set_note_tags", side_effect=DatabaseError("lost")):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse("update_note", args=[self.private_note.pk]), data)
+        self.private_note.refresh_from_db()
+        self.assertFalse(self.private_note.is_public)
+        self.assertEqual(self.counts(), {"python": 0})
+        self.assertEqual(get_profile_stats(self.user).public_note_count, 1)
+
+    def test_reconcile_and_tag_pages(self):
+        set_note_tags(self.note, ["ci/cd"])
+        Tags.objects.update(public_note_count=7)
+        call_command("reconcile_tag_counts", stdout=StringIO())
+        self.assertEqual(self.counts(), {"ci/cd": 1})
+        self.assertContains(self.client.get(reverse("tag_cloud")), reverse("tag_notes", args=["ci/cd"]))
+        response = self.client.get(reverse("tag_notes", args=["ci/cd"]))
+        self.assertEqual([note["id"] for note in response.context["notes"]], [self.note.pk])
+
+
+class TagAutocompleteTests(NotesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tag_index.warm()
+
+    def test_index_is_updated_on_tag_creation(self):
+        user = get_user_model().objects.create_user(email='complete@user.com', password='rrr')
+        set_note_tags(Notes.objects.create(user=user, title="t", description="d"), ["django", "djangorestframework"])
+        Tags.objects.create(tag="dj")
+        response = self.client.get(reverse("tag_autocomplete"), {"q": " DJANGO", "limit": 5})
+        self.assertEqual(response.json()["results"], ["django", "djangorestframework"])
+        self.assertEqual(tag_index.complete("d", 2), ["dj", "django"])
+        with self.settings(NOTES_TAG_INDEX_ENABLED=False):
+            self.assertEqual(autocomplete_tags("djangor", 5), ["djangorestframework"])
+
+    def test_lookups_do_not_query(self):
+        index = TagIndex()
+        index.tags = sorted(f"{word}-{i}" for i, word in enumerate(["python", "django", "sql", "rust"] * 25000))
+        index.loaded_at = time.monotonic()
+        with mock.patch("notes.autocomplete.tag_index", index), self.assertNumQueries(0):
+            response = self.client.get(reverse("tag_autocomplete"), {"q": "django-1", "limit": 3})
+        self.assertEqual(response.json()["results"], ["django-1", "django-10001", "django-10005"])
+
+    def test_stale_index_is_reloaded_by_one_request(self):
+        url = reverse("tag_autocomplete")
+        Tags.objects.bulk_create([Tags(tag="flask")])
+        tag_index.loaded_at = time.monotonic() - settings.NOTES_TAG_INDEX_TTL - 1
+        # another request is reloading it, this one answers from the current list
+        with tag_index.refresh_lock, self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {"q": "fl"}).json()["results"], [])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, {"q": "fl"}).json()["results"], ["flask"])
+        with self.assertNumQueries(0):
+            self.client.get(url, {"q": "fl"})
+
+
+class ProfileStatsTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(email='stats@user.com', password='rrr')
+        cls.fan = User.objects.create_user(email='fan@user.com', password='rrr')
+
+    def stats(self):
+        return ProfileStats.objects.values(*STAT_FIELDS).get(user=self.user)
+
+    def test_counters_match_recomputed_stats(self):
+        get_profile_stats(self.user)
+        first = Notes.objects.create(user=self.user, title="one", description="d", is_public=True)
+        second = Notes.objects.create(user=self.user, title="two", description="d")
+        set_note_tags(first, ["a", "b"])
+        set_note_tags(second, ["b", "c"])
+        first.toggle_like(self.fan.id)
+        second.is_public = True
+        second.save()
+        self.assertEqual(self.stats(), {"note_count": 2, "public_note_count": 2, "total_tags": 4,
+                                        "distinct_tags": 3, "likes_received": 1})
+        Notes.objects.get(pk=first.pk).delete()
+        maintained = self.stats()
+        recompute_profile_stats([self.user.pk])
+        self.assertEqual(maintained, self.stats())
+        self.assertEqual(maintained, {"note_count": 1, "public_note_count": 1, "total_tags": 2,
+                                      "distinct_tags": 2, "likes_received": 0})
+
+    def test_deleting_a_fan_uncounts_their_likes(self):
+        get_profile_stats(self.user)
+        note = Notes.objects.create(user=self.user, title="liked", description="d", is_public=True)
+        other = get_user_model().objects.create_user(email='other-fan@user.com', password='rrr')
+        own = Notes.objects.create(user=self.fan, title="own", description="d", is_public=True)
+        for fan in (self.fan, other):
+            note.toggle_like(fan.id)
+        own.toggle_like(other.id)
+        self.fan.delete()
+        note.refresh_from_db()
+        self.assertEqual(note.like_count, 1)
+        maintained = self.stats()
+        recompute_profile_stats([self.user.pk])
+        self.assertEqual(maintained, self.stats())
+        self.assertEqual(maintained["likes_received"], 1)
+
+    def test_deleting_a_tag_untags_its_notes(self):
+        get_profile_stats(self.user)
+        note = Notes.objects.create(user=self.user, title="tagged", description="d", is_public=True)
+        set_note_tags(note, ["python", "django"])
+        tag_index.warm()
+        Tags.objects.get(tag="python").delete()
+        note.refresh_from_db()
+        self.assertEqual(note.search_document, "tagged django d")
+        self.assertEqual(tag_index.complete("p", 5), [])
+        maintained = self.stats()
+        recompute_profile_stats([self.user.pk])
+        self.assertEqual(maintained, self.stats())
+        self.assertEqual(maintained["total_tags"], 1)
+
+    def test_profile_view(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse("profile")), "Total notes 0")
+        call_command("recompute_profile_stats", stdout=StringIO())
+        self.assertEqual(self.stats()["note_count"], 0)
+
+
+class SeedTests(NotesTestCase):
+
+    def seed(self, **options):
+        call_command("seed_studynotes", users=6, notes=60, tags=30, chunk_size=25, stdout=StringIO(), **options)
+
+    def test_seeded_rows_are_consistent(self):
+        self.seed()
+        self.assertEqual(Notes.objects.count(), 60)
+        for note in Notes.objects.all():
+            self.assertEqual(note.excerpt, make_excerpt(note.description))
+            self.assertEqual(note.like_count, note.userlikes_set.count())
+            self.assertNotIn(note.user_id, note.userlikes_set.values_list("users_id", flat=True))
+            self.assertTrue(note.search_document.startswith(note.title))
+        self.assertEqual(Tags.objects.annotate(actual=Count("notestags", filter=Q(notestags__notes_id__is_public=True)))
+                         .exclude(public_note_count=F("actual")).count(), 0)
+        user = Notes.objects.first().user
+        self.assertEqual(get_profile_stats(user).note_count, Notes.objects.filter(user=user).count())
+        self.assertEqual(search_notes(Notes.objects.all(), "python").count(),
+                         Notes.objects.filter(search_document__icontains="python").count())
+
+    def test_same_seed_same_notes(self):
+        self.seed(seed=3)
+        first = list(Notes.objects.order_by("pk").values_list("title", "description", "is_public", "like_count"))
+        self.seed(seed=3)
+        second = list(Notes.objects.order_by("pk").values_list("title", "description", "is_public", "like_count"))
+        self.assertEqual(second[60:], first)
+        last_pk = Notes.objects.order_by("pk").last().pk
+        note = Notes.objects.create(user=Notes.objects.first().user, title="t", description="d", link="https://a.b")
+        self.assertEqual(note.pk, last_pk + 1)
+
+
+class ExportTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(email='export@user.com', password='rrr')
+        other = User.objects.create_user(email='other@user.com', password='rrr')
+        for i in range(5):
+            note = Notes.objects.create(user=cls.user, title=f"Note {i}", description=f"<p>body {i}</p>",
+                                        link="https://example.com", is_public=i % 2 == 0)
+            set_note_tags(note, [f"tag {i}", "shared"])
+        Notes.objects.create(user=other, title="Not mine", description="d", link="https://example.com")
+
+    def export(self, fmt):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("export_notes"), {"format": fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in self.export("jsonl").decode().splitlines()]
+        self.assertEqual([row["title"] for row in rows], [f"Note {i}" for i in range(5)])
+        self.assertEqual(rows[1]["tags"], ["shared", "tag 1"])
+        self.assertEqual(rows[1]["description"], "<p>body 1</p>")
+
+    def test_csv(self):
+        rows = list(csv.DictReader(StringIO(self.export("csv").decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["tags"], "shared,tag 0")
+        self.assertEqual(rows[0]["is_public"], "True")
+
+    def test_markdown_zip(self):
+        with zipfile.ZipFile(BytesIO(self.export("md"))) as archive:
+            self.assertIsNone(archive.testzip())
+            names = archive.namelist()
+            self.assertEqual(len(names), 5)
+            self.assertTrue(names[0].endswith("-note-0.md"))
+            markdown = archive.read(names[0]).decode()
+        self.assertIn('title: "Note 0"', markdown)
+        self.assertIn("<p>body 0</p>", markdown)
+
+    def test_unknown_format(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("export_notes"), {"format": "xml"}).status_code, 400)
+
+    def test_queries_do_not_grow_with_notes(self):
+        self.client.force_login(self.user)
+        with self.settings(NOTES_EXPORT_CHUNK_SIZE=100), self.assertNumQueries(4):
+            # session, user, the notes with their owner and the tags of the chunk
+            b"".join(self.client.get(reverse("export_notes")).streaming_content)
+
+    async def test_asgi_export_is_complete(self):
+        await sync_to_async(self.client.force_login)(self.user)
+        cookie = self.client.cookies[settings.SESSION_COOKIE_NAME]
+        scope = {"type": "http", "method": "GET", "path": reverse("export_notes"), "query_string": b"format=csv",
+                 "headers": [(b"host", b"testserver"), (b"cookie", f"{cookie.key}={cookie.value}".encode())]}
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        # like the test client, keep the test transaction's connection open at the end of the request
+        request_finished.disconnect(close_old_connections)
+        try:
+            await ASGIHandler()(scope, receive, send)
+        finally:
+            request_finished.connect(close_old_connections)
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        self.assertEqual(len(list(csv.DictReader(StringIO(body.decode())))), 5)
+
+    def test_command_dumps_every_user(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "notes.jsonl"
+            call_command("export_notes", output=str(path), chunk_size=2)
+            rows = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[-1]["user"], "other@user.com")
+
+
+class ImportTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='import@user.com', password='rrr')
+
+    def upload(self, name, content, **data):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("import_notes"), {"file": SimpleUploadedFile(name, content), **data})
+        return response.status_code, response.json()
+
+    def test_jsonl_rows_are_validated_and_inserted_in_batches(self):
+        rows = [{"title": f"Note {i}", "description": f"<p>body {i}</p>", "is_public": i % 2 == 0,
+                 "tags": ["Shared", f"tag {i}"]} for i in range(5)]
+        rows.insert(2, {"title": "", "description": "<p>no title</p>"})
+        rows.insert(4, {"title": "Long tag", "description": "d", "tags": ["x" * 31]})
+        content = "".join(json.dumps(row) + "\n" for row in rows) + "not json\n"
+        with self.settings(NOTES_IMPORT_BATCH_SIZE=2):
+            status, result = self.upload("notes.jsonl", content.encode())
+        self.assertEqual(status, 200)
+        self.assertEqual((result["imported"], result["failed"]), (5, 3))
+        self.assertEqual([error["row"] for error in result["errors"]], ["line 3", "line 5", "line 8"])
+        self.assertIn("title", result["errors"][0]["errors"])
+        note = Notes.objects.get(title="Note 0")
+        self.assertEqual(note.excerpt, "body 0")
+        self.assertEqual(sorted(note.tags_set.values_list("tag", flat=True)), ["shared", "tag 0"])
+        self.assertEqual(Tags.objects.get(tag="shared").public_note_count, 3)
+        self.assertEqual(get_profile_stats(self.user).note_count, 5)
+        self.assertEqual(search_notes(Notes.objects.all(), "body").count(), 5)
+
+    def test_malformed_tags_and_booleans_are_row_errors(self):
+        rows = [
+            {"title": "Number tags", "description": "d", "tags": 3},
+            {"title": "Object tags", "description": "d", "tags": {"a": 1}},
+            {"title": "Maybe public", "description": "d", "is_public": "maybe"},
+            {"title": "Valid", "description": "d", "tags": "a,b", "is_public": "yes"},
+        ]
+        status, result = self.upload("notes.jsonl", "".join(json.dumps(row) + "\n" for row in rows).encode())
+        self.assertEqual(status, 200)
+        self.assertEqual((result["imported"], result["failed"]), (1, 3))
+        self.assertEqual([list(error["errors"]) for error in result["errors"]], [["tags"], ["tags"], ["is_public"]])
+        self.assertTrue(Notes.objects.get(title="Valid").is_public)
+
+    def test_csv_booleans_are_parsed_strictly(self):
+        values = ["no", "0", "false", "False", "", "yes", "1", "true", "True", "on"]
+        content = "title,description,is_public\n" + "".join(f"Note {value!r},d,{value}\n" for value in values)
+        status, result = self.upload("notes.csv", content.encode())
+        self.assertEqual((status, result["imported"]), (200, 10))
+        self.assertEqual(dict(Notes.objects.values_list("title", "is_public")),
+                         {f"Note {value!r}": value.lower() in ("yes", "1", "true", "on") for value in values})
+
+    def test_exports_import_back(self):
+        source = get_user_model().objects.create_user(email='source@user.com', password='rrr')
+        for i in range(3):
+            note = Notes.objects.create(user=source, title=f"Note {i}", description=f"<p>body {i}</p>",
+                                        link="https://example.com", is_public=i == 1)
+            set_note_tags(note, [f"tag {i}"])
+        for fmt, name in [("jsonl", "notes.jsonl"), ("csv", "notes.csv"), ("md", "notes.zip")]:
+            with self.subTest(fmt=fmt):
+                self.client.force_login(source)
+                exported = b"".join(
+                    chunk if isinstance(chunk, bytes) else chunk.encode()
+                    for chunk in self.client.get(reverse("export_notes"), {"format": fmt}).streaming_content)
+                status, result = self.upload(name, exported)
+                self.assertEqual((status, result["imported"], result["failed"]), (200, 3, 0))
+                imported = Notes.objects.filter(user=self.user).order_by("-pk")[:3]
+                self.assertEqual(sorted((note.title, note.description, note.is_public,
+                                         tuple(note.tags_set.values_list("tag", flat=True))) for note in imported),
+                                 [(f"Note {i}", f"<p>body {i}</p>", i == 1, (f"tag {i}",)) for i in range(3)])
+
+    def test_zip_limits(self):
+        def archive(files):
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+                for name, text in files:
+                    zip_file.writestr(name, text)
+            return buffer.getvalue()
+
+        # compresses to about a kilobyte
+        bomb = archive([("ok.md", "# Fine\n\nbody"), ("bomb.md", "# Bomb\n\n" + "a" * 1000000)])
+        with self.settings(NOTES_IMPORT_MAX_ENTRY_SIZE=1000):
+            status, result = self.upload("notes.zip", bomb)
+            self.assertEqual((status, result["imported"], result["failed"]), (200, 1, 1))
+            self.assertEqual(result["errors"][0], {"row": "bomb.md", "errors": {
+                "__all__": ["The file is larger than 1000 bytes"]}})
+
+        many = archive([(f"{i}.md", f"# Note {i}") for i in range(5)])
+        with self.settings(NOTES_IMPORT_MAX_ENTRIES=4):
+            result = self.upload("notes.zip", many)[1]
+        self.assertEqual((result["imported"], result["errors"][0]["row"]), (0, "file"))
+        with self.settings(NOTES_IMPORT_MAX_SIZE=100):
+            result = self.upload("notes.zip", many)[1]
+        self.assertEqual(result["errors"][0]["errors"]["__all__"], ["The file is larger than 100 bytes"])
+        self.assertEqual(Notes.objects.filter(user=self.user).count(), 1)
+
+    def test_unknown_format(self):
+        status, result = self.upload("notes.txt", b"")
+        self.assertEqual(status, 400)
+        self.assertIn("jsonl", result["error"])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "notes.csv"
+            path.write_text("title,description,tags\nOne,<p>one</p>,\"a,b\"\n,<p>untitled</p>,\n")
+            out, err = StringIO(), StringIO()
+            call_command("import_notes", str(path), user=self.user.email, stdout=out, stderr=err)
+        self.assertIn("Imported 1 notes, 1 rows failed", out.getvalue())
+        self.assertIn("line 3", err.getvalue())
+        self.assertEqual(Notes.objects.get(user=self.user).tags_set.count(), 2)
+
+
+class ConditionalGetTests(NotesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.author = User.objects.create_user(email='etag@user.com', password='rrr')
+        cls.reader = User.objects.create_user(email='etag-reader@user.com', password='rrr')
+        cls.note = Notes.objects.create(user=cls.author, title="Cached", description="d", is_public=True)
+
+    def revalidate(self, url, response, status):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, status)
+        return revalidated
+
+    def test_detail_is_not_rendered_again_until_the_note_changes(self):
+        url = reverse("public_detail_view", args=[self.note.pk])
+        response = self.client.get(url)
+        with self.assertNumQueries(0), self.assertTemplateNotUsed("note_detail_view.html"):
+            self.revalidate(url, response, 304)
+        set_note_tags(self.note, ["new tag"])
+        self.revalidate(url, response, 200)
+
+    def test_likes_and_viewer_change_the_etag(self):
+        url = reverse("public_detail_view", args=[self.note.pk])
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertIn("private", response["Cache-Control"])
+        self.note.toggle_like(self.author.id)
+        response = self.revalidate(url, response, 200)
+        # the reader likes and the author unlikes, the like count is back where it was but the page is not
+        self.note.toggle_like(self.reader.id)
+        self.note.toggle_like(self.author.id)
+        self.revalidate(url, response, 200)
+        self.client.force_login(self.author)
+        self.revalidate(url, self.client.get(url), 304)
+        self.client.force_login(self.reader)
+        self.revalidate(url, self.client.get(url), 304)
+
+    def test_a_new_csrf_secret_changes_the_etag(self):
+        url = reverse("public_detail_view", args=[self.note.pk])
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        self.revalidate(url, response, 304)
+        del self.client.cookies[settings.CSRF_COOKIE_NAME]
+        revalidated = self.revalidate(url, response, 200)
+        self.assertIn(settings.CSRF_COOKIE_NAME, revalidated.cookies)
+        self.assertNotEqual(revalidated["ETag"], response["ETag"])
+        self.revalidate(url, revalidated, 304)
+
+    def test_feeds(self):
+        url = reverse("public_notes")
+        response = self.client.get(url)
+        self.revalidate(url, response, 304)
+        Notes.objects.create(user=self.author, title="Newer", description="d", is_public=True)
+        self.revalidate(url, response, 200)
+        self.client.force_login(self.author)
+        url = reverse("view_notes")
+        response = self.client.get(url)
+        self.revalidate(url, response, 304)
+        self.note.title = "Renamed"
+        self.note.save()
+        self.revalidate(url, response, 200)
+
+    def test_private_and_missing_notes_still_404(self):
+        private = Notes.objects.create(user=self.author, title="Private", description="d")
+        self.assertEqual(self.client.get(reverse("public_detail_view", args=[private.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("tag_notes", args=["missing"])).status_code, 404)
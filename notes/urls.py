@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import path
 from .views import home, create_note_view, view_personal_notes,\
     view_all_public_notes, personal_note_detail_view, update_note, delete_note_view, public_note_detail_view,\
-    profile_view, like_view
+    profile_view, like_view, search_view, search_api, tag_cloud_view, tag_notes_view,\
+    tag_autocomplete_api, export_notes_view, import_notes_view
 
+if settings.NOTES_ASYNC_VIEWS:
+    from .async_views import view_all_public_notes, public_note_detail_view, search_view, search_api, like_view  # noqa
 
 urlpatterns = [
     path("", home, name="home"),
@@ -15,9 +19,17 @@ urlpatterns = [
     path("public_notes/", view_all_public_notes, name="public_notes"),
     path("public_notes/detail_view/<int:pk>/", public_note_detail_view, name="public_detail_view"),
     path("profile", profile_view, name="profile"),
+    path("export", export_notes_view, name="export_notes"),
+    path("import", import_notes_view, name="import_notes"),
 
     path("like", like_view, name="like_note"),
 
+    path("tags/", tag_cloud_view, name="tag_cloud"),
+    path("tags/<path:tag>/", tag_notes_view, name="tag_notes"),
+    path("search/", search_view, name="search"),
+    path("api/search/", search_api, name="search_api"),
+    path("api/tags/autocomplete/", tag_autocomplete_api, name="tag_autocomplete"),
+
 
 ]
 
@@ -0,0 +1,14 @@
+from html import unescape
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_WORDS = 20
+
+
+def html_to_text(html):
+    return " ".join(unescape(strip_tags(html or "")).split())
+
+
+def make_excerpt(html):
+    return Truncator(html_to_text(html)).words(EXCERPT_WORDS)
@@ -1,10 +1,33 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from .forms import NotesForm, TagsForm
-from .models import Notes, Tags, CustomUser
+from .models import Notes, Tags, CustomUser, UserLikes
 from django.urls import reverse
 from django.forms import formset_factory
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
+from django.views.decorators.http import require_POST
+from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from .autocomplete import autocomplete_tags
+from .caching import get_note_cards, get_note_detail, get_public_feed_page
+from .conditional import conditional, note_keys, personal_feed_keys, personal_feed_page, public_feed_keys,\
+    tag_feed_keys, tag_feed_page
+from .export import FORMATS, export_notes
+from .importing import READERS, guess_format, import_notes
+from .pagination import get_cursor, get_page_size
+from .search import search_notes
+from .stats import get_profile_stats
+from .tagging import normalize_tag, set_note_tags
+from StudyNotes.routers import read_from_replica
+
+
+def get_liked_note_ids(user, note_ids):
+    if not user.is_authenticated or not note_ids:
+        return set()
+    return set(UserLikes.objects.filter(users=user, notes__in=note_ids).values_list("notes_id", flat=True))
 
 
 def home(request):
@@ -12,42 +35,147 @@ def home(request):
 
 
 @login_required
+@read_from_replica
 def profile_view(request):
-    notes = Notes.objects.prefetch_related("tags_set").filter(user=request.user).annotate(tags_count=Count('tags'))
-    total_notes = notes.count()
-    total_tags = sum(tags.tags_count for tags in notes)
-    return render(request, "profile.html", {"total_notes": total_notes, "total_tags": total_tags})
+    return render(request, "profile.html", {"stats": get_profile_stats(request.user)})
 
 
 @login_required
-def view_personal_notes(request):
-    notes = Notes.objects.select_related('user').filter(user=request.user)\
-        .prefetch_related("tags_set")\
-        .prefetch_related("likes")
-    return render(request, "view_notes.html", {"notes": notes})
+def export_notes_view(request):
+    # the notes are read while the response streams, after the view has returned. Django 4.1's ASGIHandler iterates
+    # the response on the event loop where the ORM can't run, there they are read before the view returns
+    fmt = request.GET.get("format", "jsonl")
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest(f"Unknown export format, expected one of {', '.join(FORMATS)}")
+    content_type, extension = FORMATS[fmt]
+    chunks = export_notes(fmt, request.user, buffered=isinstance(request, ASGIRequest))
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="notes.{extension}"'
+    return response
 
 
-def view_all_public_notes(request):
-    notes = Notes.objects.select_related('user').filter(is_public=True)\
-        .prefetch_related("tags_set")\
-        .prefetch_related("likes")
-    return render(request, "view_notes.html", {"notes": notes})
+@login_required
+@require_POST
+def import_notes_view(request):
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"error": "Upload the notes as 'file'"}, status=400)
+    fmt = request.POST.get("format") or guess_format(upload.name)
+    if fmt not in READERS:
+        return JsonResponse({"error": f"Unknown import format, expected one of {', '.join(READERS)}"}, status=400)
+    return JsonResponse(import_notes(request.user, upload, fmt).as_dict())
 
 
+@login_required
+@conditional(personal_feed_keys)
+def view_personal_notes(request):
+    page = personal_feed_page(request)
+    notes = get_note_cards([note.pk for note in page])
+    return render(request, "view_notes.html", {"notes": notes, "page": page})
+
+
+@read_from_replica
+@conditional(public_feed_keys)
+def view_all_public_notes(request):
+    page = get_public_feed_page(*get_cursor(request), get_page_size(request))
+    notes = get_note_cards(page.object_list)
+    return render(request, "view_notes.html", {"notes": notes, "page": page,
+                                               "liked_ids": get_liked_note_ids(request.user, page.object_list)})
+
+
+def tag_cloud_view(request):
+    tags = list(Tags.objects.filter(public_note_count__gt=0)
+                .order_by("-public_note_count", "tag")[:settings.NOTES_TAG_CLOUD_SIZE])
+    top_count = tags[0].public_note_count if tags else 1
+    for tag in tags:
+        tag.weight = 1 + round(4 * tag.public_note_count / top_count)
+    return render(request, "tag_cloud.html", {"tags": sorted(tags, key=lambda tag: tag.tag)})
+
+
+@conditional(tag_feed_keys)
+def tag_notes_view(request, tag):
+    found = tag_feed_page(request, tag)
+    if found is None:
+        raise Http404("No Tags matches the given query.")
+    tag_obj, page = found
+    ids = [note.pk for note in page]
+    return render(request, "view_notes.html", {"notes": get_note_cards(ids), "page": page, "tag": tag_obj,
+                                               "liked_ids": get_liked_note_ids(request.user, ids)})
+
+
+def tag_autocomplete_api(request):
+    try:
+        limit = int(request.GET.get("limit", settings.NOTES_TAG_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.NOTES_TAG_AUTOCOMPLETE_LIMIT
+    limit = max(1, min(limit, 50))
+    return JsonResponse({"results": autocomplete_tags(normalize_tag(request.GET.get("q", "")), limit)})
+
+
+def get_search_queryset(user, query):
+    visible = Q(is_public=True)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+    notes = Notes.objects.filter(visible).select_related("user").prefetch_related("tags_set")\
+        .defer("description", "search_document", "search_vector")
+    return search_notes(notes, query)
+
+
+def get_search_page(request):
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return query, None
+    paginator = Paginator(get_search_queryset(request.user, query), get_page_size(request))
+    return query, paginator.get_page(request.GET.get("page"))
+
+
+@read_from_replica
+def search_view(request):
+    query, page = get_search_page(request)
+    return render(request, "search_results.html", {"query": query, "page": page})
+
+
+def search_response(query, page):
+    if page is None:
+        return JsonResponse({"error": "Query parameter 'q' is required"}, status=400)
+    results = [{
+        "id": note.pk,
+        "title": note.title,
+        "tags": [tag.tag for tag in note.tags_set.all()],
+        "rank": note.rank,
+        "created_at": note.created_at,
+        "url": reverse("public_detail_view" if note.is_public else "personal_detail_view", args=[note.pk]),
+    } for note in page]
+    return JsonResponse({
+        "query": query,
+        "page": page.number,
+        "num_pages": page.paginator.num_pages,
+        "count": page.paginator.count,
+        "results": results,
+    })
+
+
+@read_from_replica
+def search_api(request):
+    return search_response(*get_search_page(request))
+
+
+@read_from_replica
+@conditional(note_keys)
 def public_note_detail_view(request, pk):
-    note = get_object_or_404(Notes.objects.select_related('user')
-                             .prefetch_related("tags_set")
-                             .prefetch_related('likes'),
-                             pk=pk, is_public=True)
-    return render(request, "note_detail_view.html", {"note": note})
+    note = get_note_detail(pk)
+    if note is None or not note["is_public"]:
+        raise Http404("No Notes matches the given query.")
+    return render(request, "note_detail_view.html", {"note": note,
+                                                     "liked": bool(get_liked_note_ids(request.user, [pk]))})
 
 
 @login_required
+@conditional(note_keys)
 def personal_note_detail_view(request, pk):
-    note = get_object_or_404(Notes.objects.prefetch_related("tags_set")
-                             .prefetch_related("likes")
-                             .select_related('user'),
-                             user=request.user, pk=pk)
+    note = get_note_detail(pk)
+    if note is None or note["user_id"] != request.user.id:
+        raise Http404("No Notes matches the given query.")
     return render(request, "note_detail_view.html", {"note": note})
 
 
@@ -59,26 +187,22 @@ def update_note(request, pk):
         "form-MIN_NUM_FORMS": "0",
         "form-MAX_NUM_FORMS": "10",
     }
-    obj = get_object_or_404(Notes.objects.prefetch_related("tags_set"), user=request.user, pk=pk)
+    obj = get_object_or_404(Notes, user=request.user, pk=pk)
     form = NotesForm(request.POST or None, instance=obj)
     tags_formset = formset_factory(TagsForm)
-    qs = obj.tags_set.all()
-    data["form-TOTAL_FORMS"] = str(qs.count())
-    for i in range(len(qs)):
-        data[f"form-{i}-tag"] = qs[i]
+    tags = list(obj.tags_set.values_list("tag", flat=True))
+    data["form-TOTAL_FORMS"] = str(len(tags))
+    for i, tag in enumerate(tags):
+        data[f"form-{i}-tag"] = tag
     formset = tags_formset(request.POST or data)
 
     if request.method == "POST":
         if all([form.is_valid(), formset.is_valid()]):
-            if form.has_changed():
-                form.save()
-            tags_list = []
-            for f in formset:
-                if bool(f.cleaned_data.get("tag")):
-                    tag_obj, created = Tags.objects.get_or_create(tag=f.cleaned_data["tag"])
-                    tags_list.append(tag_obj)
-            obj.tags_set.set(tags_list)
-            obj.save()
+            # the public tag and profile counters follow is_public in post_save, they commit with the tags or not at all
+            with transaction.atomic():
+                if form.has_changed():
+                    form.save()
+                set_note_tags(obj, [f.cleaned_data.get("tag") for f in formset])
         return redirect(reverse("personal_detail_view", args=[obj.pk]))
     return render(request, "create_update_note.html", {"form": form, "formset": formset})
 
@@ -98,18 +222,9 @@ def create_note_view(request):
         formset = tags_formset(request.POST)
 
         if form.is_valid() and formset.is_valid():
-            note = Notes.objects.create(user=user_obj, **form.cleaned_data)
-
-            if not any(bool(f.cleaned_data) for f in formset):
-                """if all tags are empty - create note and redirect to detail view page"""
-                return redirect(reverse("personal_detail_view", args=[note.pk]))
-
-            tags_list = []
-            for f in formset:
-                if bool(f.cleaned_data.get("tag")):
-                    tag_obj, created = Tags.objects.get_or_create(tag=f.cleaned_data.get("tag"))
-                    tags_list.append(tag_obj)
-            note.tags_set.add(*tags_list)
+            with transaction.atomic():
+                note = Notes.objects.create(user=user_obj, **form.cleaned_data)
+                set_note_tags(note, [f.cleaned_data.get("tag") for f in formset])
             return redirect(reverse("personal_detail_view", args=[note.pk]))
 
     else:
@@ -131,12 +246,8 @@ def delete_note_view(request, pk):
 def like_view(request):
     if request.method == "POST":
         note_id = request.POST.get("note_id")
-        note_obj = get_object_or_404(Notes.objects.select_related('user'), id=note_id)
-        user = request.user
-        if user in note_obj.likes.all():
-            note_obj.remove_like(user.id)
-        else:
-            note_obj.add_like(user.id)
+        note_obj = get_object_or_404(Notes.objects.only("id"), id=note_id)
+        note_obj.toggle_like(request.user.id)
 
         if request.POST.get("page") == "detail":
             return redirect("public_detail_view", note_obj.id)